@@ -0,0 +1,118 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+The depth of coverage of a line by a collection of half-open intervals, computed from
+numpy arrays of their starts and ends without visiting each position in Python. Use
+cookbook.interval_join.intervals_as_arrays() to convert Interval objects.
+"""
+
+
+from .interval_join import _check_intervals
+import numpy
+
+
+def coverage_runs(starts, ends):
+    """
+    Compute the depth of coverage as a run-length encoding from the sorted starts and ends.
+    The runs cover the line from the first start to the last end and neighbouring runs have
+    different depths, so runs of depth 0 are the gaps between covered regions.
+
+    @return: Arrays of the starts, ends and depths of the runs.
+    """
+    starts, ends = _check_intervals(starts, ends, 'the intervals')
+    not_empty = starts < ends
+    starts, ends = starts[not_empty], ends[not_empty]
+    if 0 == len(starts):
+        return starts, ends, numpy.zeros(0, dtype=int)
+    # the depth just after each distinct position is the number of intervals that start at or
+    # before it less those that end at or before it. Sorting the starts and ends separately
+    # and searching for the positions in order is much faster than sorting events by position
+    starts = numpy.sort(starts)
+    ends = numpy.sort(ends)
+    positions = numpy.sort(numpy.concatenate((starts, ends)))
+    distinct = numpy.empty(len(positions), dtype=bool)
+    distinct[0] = True
+    distinct[1:] = positions[1:] != positions[:-1]
+    positions = positions[distinct]
+    depths = (
+        numpy.searchsorted(starts, positions[:-1], side='right')
+        - numpy.searchsorted(ends, positions[:-1], side='right'))
+    # merge neighbouring runs with the same depth, where as many intervals start as end
+    changes = numpy.empty(len(depths), dtype=bool)
+    changes[0] = True
+    changes[1:] = depths[1:] != depths[:-1]
+    run_starts = positions[:-1][changes]
+    run_ends = numpy.append(run_starts[1:], positions[-1])
+    return run_starts, run_ends, depths[changes]
+
+
+
+def depth_array(starts, ends, lo, hi):
+    """
+    Compute the depth at each integer position in [lo, hi) by taking the cumulative sum of
+    an array of the differences in depth. The starts and ends must be integers. This uses
+    memory proportional to hi - lo, use coverage_runs() for sparse coverage.
+
+    @return: An array whose i'th element is the depth at position lo + i.
+    """
+    starts, ends = _check_intervals(starts, ends, 'the intervals')
+    size = hi - lo
+    starts = numpy.clip(starts, lo, hi) - lo
+    ends = numpy.clip(ends, lo, hi) - lo
+    delta = (
+        numpy.bincount(starts, minlength=size + 1)
+        - numpy.bincount(ends, minlength=size + 1))
+    return numpy.cumsum(delta[:size])
+
+
+
+def binned_coverage(starts, ends, bin_size, lo, hi):
+    """
+    Compute the mean depth of coverage in consecutive bins of bin_size from lo up to hi. The
+    last bin is shorter if bin_size does not divide hi - lo. The depth is integrated exactly
+    over the runs from coverage_runs() so the bins may be much larger than the runs.
+
+    @return: Arrays of the starts of the bins and their mean depths.
+    """
+    run_starts, run_ends, depths = coverage_runs(starts, ends)
+    bin_starts = numpy.arange(lo, hi, bin_size)
+    bin_ends = numpy.minimum(bin_starts + bin_size, hi)
+    if 0 == len(run_starts):
+        return bin_starts, numpy.zeros(len(bin_starts))
+
+    # the integral of the depth up to each run start and the last run end
+    boundaries = numpy.append(run_starts, run_ends[-1])
+    integral = numpy.concatenate(([0], numpy.cumsum(depths * (run_ends - run_starts))))
+
+    def integrate_to(x):
+        "@return: The integral of the depth from the first run start to each x."
+        i = numpy.clip(numpy.searchsorted(boundaries, x, side='right') - 1, 0, len(depths) - 1)
+        partial = integral[i] + depths[i] * (numpy.clip(x, boundaries[0], boundaries[-1]) - boundaries[i])
+        return numpy.where(x <= boundaries[0], 0, numpy.where(x >= boundaries[-1], integral[-1], partial))
+
+    totals = integrate_to(bin_ends) - integrate_to(bin_starts)
+    return bin_starts, totals / (bin_ends - bin_starts).astype(float)
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the coverage functions against each other
+    R.seed(2)
+    size = 500
+    starts = R.randint(0, 10000, size=size)
+    ends = starts + R.poisson(50., size=size)
+    depth = depth_array(starts, ends, -10, 10100)
+    run_starts, run_ends, depths = coverage_runs(starts, ends)
+    for start, end, d in zip(run_starts, run_ends, depths):
+        assert (depth[start + 10:end + 10] == d).all()
+    assert depth[:run_starts[0] + 10].sum() == 0 and depth[run_ends[-1] + 10:].sum() == 0
+    bin_starts, means = binned_coverage(starts, ends, 100, -10, 10100)
+    for bin_start, mean in zip(bin_starts, means):
+        bin_depth = depth[bin_start + 10:bin_start + 110]
+        assert abs(mean - bin_depth.mean()) < 1e-9
@@ -0,0 +1,156 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+Arrays of half-open intervals held as numpy arrays of their starts and ends. The
+methods of cookbook.interval.Interval are applied to whole arrays at once.
+"""
+
+
+from cookbook.interval import Interval
+from .interval_join import intervals_as_arrays, _check_intervals
+import numpy
+
+
+def _as_arrays(other):
+    "@return: The starts and ends of an IntervalArray or an Interval, which broadcast against arrays."
+    if isinstance(other, IntervalArray):
+        return other._starts, other._ends
+    return other.start, other.end
+
+
+
+class IntervalArray(object):
+    """
+    An array of half-open intervals [start,end). Methods that take another interval accept
+    either an Interval, which is compared with every interval in the array, or an
+    IntervalArray of the same length, which is compared element by element.
+    """
+
+    def __init__(self, starts, ends):
+        "Construct from the starts and ends of the intervals, no start may be greater than its end."
+        starts, ends = _check_intervals(starts, ends, 'the intervals')
+
+        self._starts = starts
+        "The starts of the intervals."
+
+        self._ends = ends
+        "The ends of the intervals."
+
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        "@return: An array of the intervals."
+        return cls(*intervals_as_arrays(intervals))
+
+
+    starts = property(fget=lambda self: self._starts, doc="The starts of the intervals")
+    ends = property(fget=lambda self: self._ends, doc="The ends of the intervals")
+
+
+    def __len__(self):
+        "@return: The number of intervals."
+        return len(self._starts)
+
+
+    def __getitem__(self, index):
+        "@return: The Interval at an integer index or an IntervalArray for a slice, mask or index array."
+        if isinstance(index, (int, numpy.integer)):
+            return Interval(self._starts[index], self._ends[index])
+        return IntervalArray(self._starts[index], self._ends[index])
+
+
+    def __iter__(self):
+        "Iterate over the intervals as Interval objects."
+        for start, end in zip(self._starts, self._ends):
+            yield Interval(start, end)
+
+
+    def __repr__(self):
+        "String representation."
+        return 'IntervalArray([%s])' % ', '.join(
+            '[%s,%s)' % (start, end) for start, end in zip(self._starts, self._ends))
+
+
+    def lengths(self):
+        "@return: The lengths of the intervals."
+        return self._ends - self._starts
+
+
+    def empty(self):
+        "@return: A boolean array that is True where the intervals are empty."
+        return self._starts == self._ends
+
+
+    def contains(self, items):
+        "@return: A boolean array that is True where the item (or the items) are in the intervals."
+        return (self._starts <= items) & (items < self._ends)
+
+
+    def overlap(self, other):
+        "@return: A boolean array that is True where the intervals intersect other."
+        other_starts, other_ends = _as_arrays(other)
+        return (self._starts < other_ends) & (other_starts < self._ends)
+
+
+    def intersection(self, other):
+        "@return: The intersections, which are empty at the lower start where there is none, see Interval.intersection()."
+        other_starts, other_ends = _as_arrays(other)
+        starts = numpy.maximum(self._starts, other_starts)
+        ends = numpy.minimum(self._ends, other_ends)
+        disjoint = ends <= starts
+        lower_starts = numpy.minimum(self._starts, other_starts)
+        starts = numpy.where(disjoint, lower_starts, starts)
+        ends = numpy.where(disjoint, lower_starts, ends)
+        return IntervalArray(starts, ends)
+
+
+    def hull(self, other):
+        "@return: The intervals containing both the intervals and other."
+        other_starts, other_ends = _as_arrays(other)
+        return IntervalArray(
+            numpy.minimum(self._starts, other_starts),
+            numpy.maximum(self._ends, other_ends))
+
+
+    def separation(self, other):
+        "@return: The distances between the intervals and other, signed as for Interval.separation()."
+        other_starts, other_ends = _as_arrays(other)
+        return numpy.where(
+            self.overlap(other),
+            0,
+            numpy.where(
+                other_ends <= self._starts,
+                self._starts - other_ends,
+                self._ends - other_starts))
+
+
+    def subset(self, other):
+        "@return: A boolean array that is True where the intervals are subsets of other."
+        other_starts, other_ends = _as_arrays(other)
+        return (self._starts >= other_starts) & (self._ends <= other_ends)
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the IntervalArray against Interval
+    R.seed(2)
+    size = 50
+    starts = R.randint(-50, 50, size=size)
+    a = IntervalArray(starts, starts + R.poisson(10., size=size))
+    b = a[R.permutation(size)]
+    q = Interval(0, 5)
+    for x, y, overlap, intersection, hull, separation, subset in zip(
+        a, b, a.overlap(b), a.intersection(b), a.hull(q), a.separation(q), a.subset(b)
+    ):
+        assert overlap == x.overlap(y)
+        assert (intersection.start, intersection.end) == (x.intersection(y).start, x.intersection(y).end)
+        assert (hull.start, hull.end) == (x.hull(q).start, x.hull(q).end)
+        assert separation == x.separation(q)
+        assert subset == x.subset(y)
+    assert (a.contains(3) == [3 in x for x in a]).all()
@@ -0,0 +1,326 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+A static index of half-open intervals held in sorted numpy arrays. It is built once
+and then answers whole arrays of queries at a time, which uses much less memory than
+an rbintervaltree and answers queries from contiguous sorted arrays. Intervals
+[s1,e1) and [s2,e2) overlap iff s1 < e2 and s2 < e1, as for cookbook.interval.Interval.
+"""
+
+
+from .interval_join import intervals_as_arrays, _check_intervals, _expand, _sort_starts
+import numpy
+
+
+def _prefix_lengths(values, lo, hi, bounds, below):
+    """
+    Find the length of the longest prefix of each values[lo[j]:hi[j]] whose values are all
+    less than bounds[j] if below is True, or all greater than it if not. The values in each
+    range must be ordered so that those that qualify come first. The length is doubled until
+    it does not qualify and then the gap is halved, which takes O(log k) for a prefix of
+    length k.
+
+    @return: An array of the lengths.
+    """
+    def qualifies(positions, b):
+        v = values[positions]
+        return v < b if below else v > b
+    sizes = hi - lo
+    good = numpy.zeros(len(lo), dtype=int)  # the longest length known to qualify
+    bad = sizes + 1  # the shortest length known not to qualify
+    active = numpy.arange(len(lo))
+    length = 1
+    while len(active):
+        within = length <= sizes[active]
+        passed = numpy.zeros(len(active), dtype=bool)
+        passed[within] = qualifies(lo[active[within]] + length - 1, bounds[active[within]])
+        good[active[passed]] = length
+        bad[active[within & ~passed]] = length
+        active = active[passed]
+        length *= 2
+    active = numpy.nonzero(bad - good > 1)[0]
+    while len(active):
+        mid = (good[active] + bad[active]) // 2
+        passed = qualifies(lo[active] + mid - 1, bounds[active])
+        good[active[passed]] = mid[passed]
+        bad[active[~passed]] = mid[~passed]
+        active = active[bad[active] - good[active] > 1]
+    return good
+
+
+
+def _bit_lengths(x):
+    "@return: The number of bits needed to represent each of the positive integers x."
+    return numpy.frexp(x)[1]
+
+
+
+class _CentredIntervalTree(object):
+    """
+    A static centred interval tree of the non-empty intervals, see de Berg et al.
+    Computational Geometry 3rd edition pg 220. Each node has a centre and holds the
+    intervals that contain it. Those that end at or before the centre are in the left
+    subtree and those that start after it in the right.
+
+    The nodes are the positions 1 to n of the sorted starts arranged as an implicit
+    balanced binary search tree, where node i has i's lowest set bit h and children
+    i - h / 2 and i + h / 2, and node i's centre is the i'th smallest start. The starts
+    in an interval are at a range of positions and its node is the one in that range
+    nearest the root, the one with the most trailing zero bits. Each node's intervals
+    are stored sorted by start and by end in descending order.
+    """
+
+    def __init__(self, starts, ends, order, sorted_starts):
+        "Construct from the starts and ends of the intervals, the order that sorts them by start and the sorted starts."
+        items = order[sorted_starts < ends[order]]
+        # the starts in each interval are at positions lo to hi - 1, which are nodes lo + 1 to hi
+        lo = numpy.searchsorted(sorted_starts, starts[items], side='left')
+        hi = numpy.searchsorted(sorted_starts, ends[items], side='left')
+        nodes = hi & -(1 << (_bit_lengths(lo ^ hi) - 1))
+        by_start = numpy.argsort(nodes, kind='mergesort')
+
+        self.centres = sorted_starts
+        "The centre of node i is centres[i-1]."
+
+        self.root = 1 << (int(_bit_lengths(len(sorted_starts))) - 1) if len(sorted_starts) else 0
+        "The root node, the largest power of 2 no greater than n, or 0 if there are no nodes."
+
+        counts = numpy.bincount(nodes, minlength=len(sorted_starts) + 1)[1:]
+        self.offsets = numpy.concatenate(([0], numpy.cumsum(counts)))
+        "Node i's intervals are at offsets[i-1]:offsets[i] in by_start."
+
+        self.by_start = items[by_start]
+        "The intervals of each node sorted by start."
+
+        self.by_end = items[numpy.lexsort((ends[items], nodes))][::-1]
+        "The intervals of each node sorted by end in descending order, the nodes in reverse order."
+
+        self.sorted_starts = starts[self.by_start]
+        "The starts of the intervals in by_start."
+
+        self.sorted_ends = ends[self.by_end]
+        "The ends of the intervals in by_end."
+
+
+    def stabbing(self, points):
+        """
+        Find the intervals that start before and end after each point. Each point is passed
+        down one path from the root. At a node whose centre is not less than the point the
+        intervals that start before it are a prefix of those sorted by start, otherwise those
+        that end after it are a prefix of those sorted by end. This takes O(log n + k) time
+        for k intervals.
+
+        @return: Arrays ip and ii such that interval ii[k] contains point ip[k].
+        """
+        ip, ii = [numpy.zeros(0, dtype=int)], [numpy.zeros(0, dtype=int)]
+        n = len(self.centres)
+        total = len(self.by_start)
+        active = numpy.arange(len(points)) if n else numpy.zeros(0, dtype=int)
+        step = self.root
+        x = numpy.zeros(len(active), dtype=int) + step
+        while len(active):
+            # the nodes after n are not in the tree but are on the way to some that are
+            exists = x <= n
+            p = points[active]
+            c = self.centres[numpy.minimum(x, n) - 1]
+            for use_start, values, intervals in (
+                (True, self.sorted_starts, self.by_start),
+                (False, self.sorted_ends, self.by_end),
+            ):
+                use = exists & ((p <= c) if use_start else (p > c))
+                if use_start:
+                    lo, hi = self.offsets[x[use] - 1], self.offsets[x[use]]
+                else:
+                    lo, hi = total - self.offsets[x[use]], total - self.offsets[x[use] - 1]
+                lengths = _prefix_lengths(values, lo, hi, p[use], use_start)
+                which, positions = _expand(lo, lo + lengths)
+                ip.append(active[use][which])
+                ii.append(intervals[positions])
+            step //= 2
+            if 0 == step:
+                break
+            go_left = ~exists | (p < c)
+            descend = go_left | (p > c)
+            x = numpy.where(go_left, x - step, x + step)
+            active, x = active[descend], x[descend]
+        return numpy.concatenate(ip), numpy.concatenate(ii)
+
+
+
+class IntervalIndex(object):
+    """
+    A static index of half-open intervals given by arrays of their starts and ends. Queries
+    refer to the intervals by their positions in these arrays.
+    """
+
+    def __init__(self, starts, ends):
+        "Construct from the starts and ends of the intervals."
+        starts, ends = _check_intervals(starts, ends, 'the intervals')
+
+        self._starts = starts
+        "The starts of the intervals."
+
+        self._ends = ends
+        "The ends of the intervals."
+
+        self._sorted = _sort_starts(starts)
+        "The order that sorts the intervals by start and the sorted starts."
+
+        self._sorted_ends = numpy.sort(ends)
+        "The ends of the intervals in sorted order."
+
+        self._empty_points = numpy.sort(starts[starts == ends])
+        "The positions of the empty intervals in sorted order."
+
+        # the position in start order of the interval with the largest end of those that
+        # start no later than each interval
+        order = self._sorted[0]
+        ends_by_start = ends[order]
+        running_max = numpy.maximum.accumulate(ends_by_start)
+        is_new_max = numpy.empty(len(ends), dtype=bool)
+        is_new_max[:1] = True
+        is_new_max[1:] = running_max[1:] != running_max[:-1]
+        positions = numpy.where(is_new_max, numpy.arange(len(ends)), 0)
+        self._max_end_positions = numpy.maximum.accumulate(positions)
+        "The position in start order of the interval with the largest end up to each position."
+
+        self._centred_tree = None
+        "A _CentredIntervalTree of the intervals, built when overlaps() is first called."
+
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        "@return: An index of the intervals, e.g. cookbook.interval.Interval objects."
+        return cls(*intervals_as_arrays(intervals))
+
+
+    starts = property(fget=lambda self: self._starts, doc="The starts of the intervals")
+    ends = property(fget=lambda self: self._ends, doc="The ends of the intervals")
+
+
+    def __len__(self):
+        "@return: The number of intervals in the index."
+        return len(self._starts)
+
+
+    def overlap_counts(self, starts, ends):
+        """
+        Count the intervals that overlap each of the query intervals in O(log n) time each.
+
+        @return: An array of the counts.
+        """
+        starts, ends = _check_intervals(starts, ends, 'the queries')
+        # those intervals that start before the query ends less those that also end before
+        # it starts, all of which do unless both are empty and at the same place
+        counts = numpy.searchsorted(self._sorted[1], ends, side='left')
+        counts -= numpy.searchsorted(self._sorted_ends, starts, side='right')
+        empty = starts == ends
+        if empty.any() and len(self._empty_points):
+            points = starts[empty]
+            counts[empty] += (
+                numpy.searchsorted(self._empty_points, points, side='right')
+                - numpy.searchsorted(self._empty_points, points, side='left'))
+        return counts
+
+
+    def overlaps(self, starts, ends, sort=True):
+        """
+        Find all the intervals that overlap each of the query intervals. Those that start in
+        a query are found by binary searches of the sorted starts and those that start before
+        it and end after it starts by a centred interval tree, which is built the first time
+        this is called. This takes O(m log n + k) time for m queries and k overlaps.
+
+        @return: Arrays iq and ii such that query iq[k] overlaps interval ii[k]. If sort is True
+        the pairs are sorted by iq and then ii.
+        """
+        starts, ends = _check_intervals(starts, ends, 'the queries')
+        order, sorted_starts = self._sorted
+
+        # intervals that start in the query, except empty ones where it starts
+        lo = numpy.searchsorted(sorted_starts, starts, side='left')
+        hi = numpy.searchsorted(sorted_starts, ends, side='left')
+        iq1, positions = _expand(lo, hi)
+        ii1 = order[positions]
+        keep = starts[iq1] < self._ends[ii1]
+        iq1, ii1 = iq1[keep], ii1[keep]
+
+        # intervals that start before the query and end after it starts
+        iq2, ii2 = self._get_centred_tree().stabbing(starts)
+
+        iq = numpy.concatenate((iq1, iq2))
+        ii = numpy.concatenate((ii1, ii2))
+        if sort:
+            order = numpy.lexsort((ii, iq))
+            iq, ii = iq[order], ii[order]
+        return iq, ii
+
+
+    def _get_centred_tree(self):
+        "@return: The centred interval tree of the intervals, building it if this is the first call."
+        if None is self._centred_tree:
+            order, sorted_starts = self._sorted
+            self._centred_tree = _CentredIntervalTree(self._starts, self._ends, order, sorted_starts)
+        return self._centred_tree
+
+
+    def nearest(self, starts, ends):
+        """
+        Find the interval nearest each of the query intervals in O(log n) time each. The distance
+        between intervals is 0 if they overlap or touch, otherwise it is the size of the gap
+        between them. Overlapping intervals are preferred to those that just touch the query.
+
+        @return: An array of the positions of the nearest intervals and an array of their
+        distances. The positions are -1 and the distances infinite if the index is empty.
+        """
+        starts, ends = _check_intervals(starts, ends, 'the queries')
+        order, sorted_starts = self._sorted
+        n = len(sorted_starts)
+        nearest = numpy.empty(len(starts), dtype=int)
+        nearest[:] = -1
+        distances = numpy.empty(len(starts))
+        distances[:] = numpy.inf
+        if 0 == n:
+            return nearest, distances
+
+        # of the intervals that start before the query ends, the one that ends last is nearest
+        hi = numpy.searchsorted(sorted_starts, ends, side='left')
+        has_left = hi > 0
+        left = order[self._max_end_positions[numpy.maximum(hi - 1, 0)]]
+        left_distances = numpy.maximum(starts - self._ends[left], 0)
+        nearest[has_left] = left[has_left]
+        distances[has_left] = left_distances[has_left]
+
+        # of the others, the one that starts first is nearest
+        has_right = hi < n
+        right = order[numpy.minimum(hi, n - 1)]
+        right_distances = self._starts[right] - ends
+        better = has_right & (right_distances < distances)
+        nearest[better] = right[better]
+        distances[better] = right_distances[better]
+        return nearest, distances
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the IntervalIndex against brute force
+    R.seed(2)
+    n, m = 200, 300
+    starts = R.randint(0, 1000, size=n)
+    ends = starts + R.poisson(5., size=n)
+    index = IntervalIndex(starts, ends)
+    q_starts = R.randint(-50, 1050, size=m)
+    q_ends = q_starts + R.poisson(5., size=m)
+    overlapping = (starts[None, :] < q_ends[:, None]) & (q_starts[:, None] < ends[None, :])
+    assert (index.overlap_counts(q_starts, q_ends) == overlapping.sum(axis=1)).all()
+    iq, ii = index.overlaps(q_starts, q_ends)
+    assert list(zip(iq, ii)) == list(zip(*numpy.nonzero(overlapping)))
+    nearest, distances = index.nearest(q_starts, q_ends)
+    gaps = numpy.maximum(numpy.maximum(starts[None, :] - q_ends[:, None], q_starts[:, None] - ends[None, :]), 0)
+    assert (distances == gaps.min(axis=1)).all()
+    assert (gaps[numpy.arange(m), nearest] == distances).all()
@@ -0,0 +1,138 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+Join two sets of half-open intervals on overlap in bulk. The intervals are given as
+numpy arrays of starts and ends and the overlapping pairs are returned as arrays of
+indices, so no Interval objects are created. Two intervals [s1,e1) and [s2,e2) overlap
+iff s1 < e2 and s2 < e1.
+
+The join sorts each set by start and uses binary searches to count, for each interval,
+the intervals of the other set that start inside it. Every overlapping pair has exactly
+one interval that starts inside the other (or they start together) so each pair is
+found once. This takes O((n + m) log(n + m) + k) time for k overlapping pairs.
+"""
+
+
+import numpy
+
+
+def intervals_as_arrays(intervals):
+    "@return: Arrays of the starts and ends of the intervals."
+    intervals = list(intervals)
+    return (
+        numpy.array([i.start for i in intervals]),
+        numpy.array([i.end for i in intervals]),
+    )
+
+
+
+def _check_intervals(starts, ends, name):
+    "@return: The starts and ends as 1-dimensional arrays after checking they are valid intervals."
+    starts = numpy.asarray(starts)
+    ends = numpy.asarray(ends)
+    if 1 != starts.ndim or starts.shape != ends.shape:
+        raise ValueError('Starts and ends of %s must be 1-dimensional arrays of the same length' % name)
+    if (ends < starts).any():
+        raise ValueError('Starts of %s must not be greater than their ends' % name)
+    return starts, ends
+
+
+
+def _expand(lo, hi):
+    """
+    Expand the ranges [lo[i], hi[i]) into one array.
+
+    @return: The index i of each range and the positions in the ranges.
+    """
+    counts = numpy.maximum(hi - lo, 0)
+    total = counts.sum()
+    which = numpy.repeat(numpy.arange(len(lo)), counts)
+    offsets = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return which, lo[which] + offsets
+
+
+
+def _sort_starts(starts):
+    "@return: The order that sorts the starts and the sorted starts."
+    order = numpy.argsort(starts, kind='mergesort')
+    return order, starts[order]
+
+
+
+def _starting_inside(starts, ends, order, sorted_starts, side):
+    """
+    Find the intervals of the other set that start inside each of these intervals. The other
+    set is given by the order that sorts its starts and the sorted starts. With side='left' the
+    other intervals may start at the same place, with side='right' they may not.
+
+    @return: The indexes of the pairs into these intervals and the other intervals.
+    """
+    lo = numpy.searchsorted(sorted_starts, starts, side=side)
+    hi = numpy.searchsorted(sorted_starts, ends, side='left')
+    i, positions = _expand(lo, hi)
+    return i, order[positions]
+
+
+
+def overlap_join(a_starts, a_ends, b_starts, b_ends, sort=True):
+    """
+    Find all the pairs of overlapping intervals between the set a and the set b.
+
+    @return: Arrays ia and ib such that interval ia[k] of a overlaps interval ib[k] of b. If
+    sort is True the pairs are sorted by ia and then ib.
+    """
+    a_starts, a_ends = _check_intervals(a_starts, a_ends, 'a')
+    b_starts, b_ends = _check_intervals(b_starts, b_ends, 'b')
+
+    return _join_sorted(
+        a_starts, a_ends, _sort_starts(a_starts),
+        b_starts, b_ends, _sort_starts(b_starts),
+        sort)
+
+
+
+def _join_sorted(a_starts, a_ends, a_sorted, b_starts, b_ends, b_sorted, sort):
+    """
+    Overlap join where the orders and sorted starts of both sets have already been computed
+    by _sort_starts(), see overlap_join().
+    """
+    # pairs where b starts in a or they start together
+    ia1, ib1 = _starting_inside(a_starts, a_ends, b_sorted[0], b_sorted[1], 'left')
+    # an empty b that starts with a does not overlap it
+    keep = a_starts[ia1] < b_ends[ib1]
+    ia1, ib1 = ia1[keep], ib1[keep]
+
+    # pairs where a starts strictly inside b
+    ib2, ia2 = _starting_inside(b_starts, b_ends, a_sorted[0], a_sorted[1], 'right')
+
+    ia = numpy.concatenate((ia1, ia2))
+    ib = numpy.concatenate((ib1, ib2))
+    if sort:
+        order = numpy.lexsort((ib, ia))
+        ia, ib = ia[order], ib[order]
+    return ia, ib
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the overlap join against a brute force join
+    R.seed(2)
+    n, m = 200, 300
+    a_starts = R.randint(0, 1000, size=n)
+    a_ends = a_starts + R.poisson(20., size=n)
+    b_starts = R.randint(0, 1000, size=m)
+    b_ends = b_starts + R.poisson(10., size=m)
+    ia, ib = overlap_join(a_starts, a_ends, b_starts, b_ends)
+    expected = [
+        (i, j)
+        for i in range(n)
+        for j in range(m)
+        if a_starts[i] < b_ends[j] and b_starts[j] < a_ends[i]
+    ]
+    assert list(zip(ia, ib)) == expected
@@ -0,0 +1,217 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+Sets of points on a line represented as sorted disjoint half-open intervals. Collections
+of intervals are coalesced into runs in one sort-and-sweep and whole sets are combined
+with numpy operations on their boundaries.
+"""
+
+
+from cookbook.interval import Interval
+from .interval_join import intervals_as_arrays, _check_intervals
+import numpy
+
+
+def _coalesce_sorted(starts, ends):
+    """
+    Merge the non-empty intervals, which are sorted by start, where they overlap or touch.
+
+    @return: The starts and ends of the merged runs.
+    """
+    if 0 == len(starts):
+        return starts, ends
+    max_ends = numpy.maximum.accumulate(ends)
+    # a new run starts wherever an interval starts after all the previous ones have ended
+    new_run = numpy.empty(len(starts), dtype=bool)
+    new_run[0] = True
+    new_run[1:] = starts[1:] > max_ends[:-1]
+    last_in_run = numpy.empty(len(starts), dtype=bool)
+    last_in_run[:-1] = new_run[1:]
+    last_in_run[-1] = True
+    return starts[new_run], max_ends[last_in_run]
+
+
+
+def _interleave(starts, ends):
+    "@return: The starts and ends of the runs in one array, each start followed by its end."
+    boundaries = numpy.empty(2 * len(starts), dtype=numpy.result_type(starts, ends))
+    boundaries[0::2] = starts
+    boundaries[1::2] = ends
+    return boundaries
+
+
+
+class IntervalSet(object):
+    """
+    A set of points given by the union of some half-open intervals. It is stored as the
+    sorted disjoint runs that cover the same points, where no two runs touch.
+    """
+
+    def __init__(self, starts=(), ends=()):
+        "Construct from the starts and ends of intervals, which may overlap and be in any order."
+        starts, ends = _check_intervals(starts, ends, 'the intervals')
+        not_empty = starts < ends
+        starts, ends = starts[not_empty], ends[not_empty]
+        order = numpy.argsort(starts, kind='mergesort')
+        starts, ends = _coalesce_sorted(starts[order], ends[order])
+
+        self._starts = starts
+        "The starts of the runs in order."
+
+        self._ends = ends
+        "The ends of the runs in order."
+
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        "@return: The set of points in any of the intervals."
+        return cls(*intervals_as_arrays(intervals))
+
+
+    @classmethod
+    def _from_runs(cls, starts, ends):
+        "@return: A set made of runs that are already sorted, disjoint and do not touch."
+        s = cls.__new__(cls)
+        s._starts = starts
+        s._ends = ends
+        return s
+
+
+    starts = property(fget=lambda self: self._starts, doc="The starts of the runs in order")
+    ends = property(fget=lambda self: self._ends, doc="The ends of the runs in order")
+
+
+    def __len__(self):
+        "@return: The number of runs."
+        return len(self._starts)
+
+
+    def __iter__(self):
+        "Iterate over the runs as Interval objects."
+        for start, end in zip(self._starts, self._ends):
+            yield Interval(start, end)
+
+
+    def __repr__(self):
+        "String representation."
+        return 'IntervalSet([%s])' % ', '.join(
+            '[%s,%s)' % (start, end) for start, end in zip(self._starts, self._ends))
+
+
+    def __contains__(self, point):
+        "@return: True iff the point is in the set."
+        return bool(self.contains(point))
+
+
+    def __eq__(self, other):
+        "@return: True iff the sets hold the same points."
+        return (
+            isinstance(other, IntervalSet)
+            and numpy.array_equal(self._starts, other._starts)
+            and numpy.array_equal(self._ends, other._ends))
+
+
+    def __ne__(self, other):
+        "@return: True iff the sets do not hold the same points."
+        return not self == other
+
+
+    __hash__ = None
+
+
+    def contains(self, points):
+        "@return: A boolean array that is True where the points are in the set."
+        points = numpy.asarray(points)
+        if 0 == len(self._starts):
+            return numpy.zeros(points.shape, dtype=bool)
+        i = numpy.searchsorted(self._starts, points, side='right') - 1
+        return (i >= 0) & (points < self._ends[numpy.maximum(i, 0)])
+
+
+    def covered_length(self):
+        "@return: The total length of the runs."
+        return (self._ends - self._starts).sum()
+
+
+    def union(self, other):
+        "@return: The set of points in either set."
+        return self._combine(other, numpy.logical_or)
+
+
+    def intersection(self, other):
+        "@return: The set of points in both sets."
+        return self._combine(other, numpy.logical_and)
+
+
+    def difference(self, other):
+        "@return: The set of points in this set but not in other."
+        return self._combine(other, lambda a, b: a & ~b)
+
+
+    def symmetric_difference(self, other):
+        "@return: The set of points in exactly one of the sets."
+        return self._combine(other, numpy.logical_xor)
+
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
+
+
+    def complement(self, start, end):
+        "@return: The set of points in [start, end) that are not in this set."
+        return IntervalSet([start], [end]).difference(self)
+
+
+    def _combine(self, other, op):
+        """
+        Split the line at every boundary of either set and keep the pieces for which op of
+        whether they are in this set and whether they are in the other is True. The runs of
+        each set are sorted and disjoint so its boundaries are already in order, and a stable
+        sort merges the two sequences of boundaries in linear time. A piece is in a set iff an
+        odd number of the set's boundaries come at or before it, so this takes O(n + m) time.
+
+        @return: The combined set.
+        """
+        ours = _interleave(self._starts, self._ends)
+        theirs = _interleave(other._starts, other._ends)
+        # leave out empty sets so their default dtype does not change the result's
+        boundaries = [a for a in (ours, theirs) if len(a)]
+        if not boundaries:
+            return self
+        points = numpy.concatenate(boundaries)
+        is_ours = numpy.arange(len(points)) < len(ours)
+        order = numpy.argsort(points, kind='mergesort')
+        points, is_ours = points[order], is_ours[order]
+        in_ours = 1 == numpy.cumsum(is_ours) % 2
+        in_theirs = 1 == numpy.cumsum(~is_ours) % 2
+        # pieces between equal boundaries are empty
+        keep = op(in_ours[:-1], in_theirs[:-1]) & (points[:-1] < points[1:])
+        return IntervalSet._from_runs(*_coalesce_sorted(points[:-1][keep], points[1:][keep]))
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the IntervalSet against sets of integers
+    R.seed(2)
+    def random_set(size):
+        starts = R.randint(0, 200, size=size)
+        return IntervalSet(starts, starts + R.poisson(5., size=size))
+    def points(s):
+        return set(p for i in s for p in range(i.start, i.end))
+    a, b = random_set(30), random_set(40)
+    assert (a | b) == IntervalSet(numpy.concatenate((a.starts, b.starts)), numpy.concatenate((a.ends, b.ends)))
+    assert points(a | b) == points(a) | points(b)
+    assert points(a & b) == points(a) & points(b)
+    assert points(a - b) == points(a) - points(b)
+    assert points(a ^ b) == points(a) ^ points(b)
+    assert points(a.complement(-10, 210)) == set(range(-10, 210)) - points(a)
+    assert a.covered_length() == len(points(a))
+    assert all(x.end < y.start for x, y in zip(list(a), list(a)[1:]))
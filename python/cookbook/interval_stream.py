@@ -0,0 +1,141 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+Overlap two streams of intervals in a single pass. The streams must be sorted by start
+(and by label first if they are labelled, for example by chromosome) and only the
+intervals that may still overlap something later are held in memory, so inputs of any
+size can be intersected. Overlap has the same half-open semantics as
+cookbook.interval.Interval.overlap().
+"""
+
+
+from cookbook.interval import Interval
+import heapq
+
+
+def read_bed(lines):
+    """
+    Read intervals from the lines of a BED file. Blank lines, comments and track and browser
+    lines are skipped. BED intervals are half-open and start from 0 like Interval.
+
+    @return: A generator of (chromosome, Interval, other fields) tuples.
+    """
+    for line in lines:
+        fields = line.rstrip('\r\n').split('\t')
+        if not fields[0] or fields[0].startswith(('#', 'track', 'browser')):
+            continue
+        if len(fields) < 3:
+            raise ValueError('BED lines must have at least 3 fields: %r' % line)
+        yield fields[0], Interval(int(fields[1]), int(fields[2])), fields[3:]
+
+
+
+def stream_overlaps(a, b, interval=None, label=None):
+    """
+    Find the overlapping pairs of items from the iterables a and b, which must both be
+    sorted by label and then by the start of the items' intervals. interval gives an item's
+    Interval and label its label, by default the items are intervals and are not labelled.
+
+    The streams are merged by start and each item is checked against the active items of the
+    other stream, which are those that have not ended before it starts. These are kept in
+    heaps ordered by end so those that have ended are dropped as the sweep moves on.
+
+    @return: A generator of (item from a, item from b) pairs in the order that the later
+    starting item of each pair is reached.
+    @raise ValueError: If either stream is not sorted.
+    """
+    if None == interval:
+        interval = lambda item: item
+    if None == label:
+        label = lambda item: None
+    streams = (_sorted_stream(a, interval, label, 'a'), _sorted_stream(b, interval, label, 'b'))
+    active = ([], [])  # heaps of (end, count, start, item) for each stream
+    count = 0
+    current_label = None
+    for which, item_label, start, end, item in _merge(streams):
+        if item_label != current_label:
+            current_label = item_label
+            active = ([], [])
+        for heap in active:
+            while heap and heap[0][0] <= start:
+                heapq.heappop(heap)
+        for other_end, c, other_start, other in active[1 - which]:
+            if other_start < end and start < other_end:
+                if 0 == which:
+                    yield item, other
+                else:
+                    yield other, item
+        heapq.heappush(active[which], (end, count, start, item))
+        count += 1
+
+
+def bed_overlaps(a_lines, b_lines):
+    """
+    Find the overlapping pairs of records from the lines of two BED files, which must both be
+    sorted by chromosome and then start, for example by 'sort -k1,1 -k2,2n'.
+
+    @return: A generator of pairs of records as returned by read_bed().
+    """
+    return stream_overlaps(
+        read_bed(a_lines), read_bed(b_lines),
+        interval=lambda record: record[1],
+        label=lambda record: record[0])
+
+
+
+def _sorted_stream(items, interval, label, name):
+    """
+    @return: A generator of (label, start, end, item) tuples for the items.
+    @raise ValueError: If the items are not sorted by label and then start.
+    """
+    previous = None
+    for item in items:
+        i = interval(item)
+        key = (label(item), i.start)
+        if None != previous and key < previous:
+            raise ValueError('Stream %s is not sorted: %s follows %s' % (name, key, previous))
+        previous = key
+        yield key[0], i.start, i.end, item
+
+
+
+def _merge(streams):
+    "@return: A generator of (which stream, label, start, end, item) tuples from both streams in order."
+    heads = []
+    for which, stream in enumerate(streams):
+        head = next(stream, None)
+        if None != head:
+            heads.append((head[:2], which, head))
+    heapq.heapify(heads)
+    while heads:
+        key, which, head = heads[0]
+        yield (which,) + head
+        head = next(streams[which], None)
+        if None == head:
+            heapq.heappop(heads)
+        else:
+            heapq.heapreplace(heads, (head[:2], which, head))
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test stream_overlaps against brute force
+    R.seed(2)
+    def random_intervals(size):
+        starts = sorted(R.randint(0, 1000, size=size))
+        return [Interval(start, start + length) for start, length in zip(starts, R.poisson(10., size=size))]
+    a, b = random_intervals(200), random_intervals(300)
+    overlaps = set((id(x), id(y)) for x, y in stream_overlaps(a, b))
+    assert overlaps == set((id(x), id(y)) for x in a for y in b if x.overlap(y))
+
+    # and read some BED lines
+    a_lines = ['track name=a\n', 'chr1\t10\t20\tx\n', 'chr1\t15\t30\ty\n', 'chr2\t0\t5\tz\n']
+    b_lines = ['chr1\t18\t19\n', 'chr2\t5\t10\n']
+    pairs = [(x[2][0], y[1].start) for x, y in bed_overlaps(a_lines, b_lines)]
+    assert pairs == [('x', 18), ('y', 18)]
@@ -0,0 +1,218 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+Indexes of intervals partitioned by a label, for example the chromosome or contig that
+genomic intervals lie on. Each partition is a cookbook.interval_index.IntervalIndex and
+batches of labelled queries are split by partition and can be answered in parallel by a
+pool of processes.
+"""
+
+
+from .interval_index import IntervalIndex
+import multiprocessing
+import numpy
+
+
+def _query_worker(task):
+    "@return: The result of a query of a partition in a worker process."
+    index, method, starts, ends = task
+    return getattr(index, method)(starts, ends)
+
+
+
+def _group_by_label(labels):
+    "@return: A list of (label, positions) pairs giving the positions of each distinct label."
+    labels = numpy.asarray(labels)
+    if 0 == len(labels):
+        return []
+    distinct, inverse = numpy.unique(labels, return_inverse=True)
+    order = numpy.argsort(inverse, kind='mergesort')
+    boundaries = numpy.searchsorted(inverse[order], numpy.arange(1, len(distinct)))
+    return list(zip(distinct.tolist(), numpy.split(order, boundaries)))
+
+
+
+class PartitionedIntervalIndex(object):
+    """
+    A collection of interval indexes, one for each partition label. Each interval has an id,
+    which is its position in the records the index was built from or is given when its
+    partition is loaded, and queries return these ids.
+    """
+
+    def __init__(self):
+        "Construct an index with no partitions."
+
+        self._indexes = dict()
+        "Maps each label to the index of its partition."
+
+        self._ids = dict()
+        "Maps each label to the ids of the intervals in its partition."
+
+
+    @classmethod
+    def from_records(cls, labels, starts, ends):
+        """
+        @return: An index of the intervals with the given labels, starts and ends. Their ids
+        are their positions in these arrays.
+        """
+        index = cls()
+        starts = numpy.asarray(starts)
+        ends = numpy.asarray(ends)
+        for label, positions in _group_by_label(labels):
+            index.load(label, starts[positions], ends[positions], ids=positions)
+        return index
+
+
+    def load(self, label, starts, ends, ids=None):
+        """
+        Build the partition with the label from the starts and ends of its intervals, replacing
+        any existing partition with that label. The ids default to the intervals' positions.
+        """
+        index = IntervalIndex(starts, ends)
+        if None is ids:
+            ids = numpy.arange(len(index))
+        else:
+            ids = numpy.asarray(ids)
+            if ids.shape != (len(index),):
+                raise ValueError('There must be one id for each interval')
+        self._indexes[label] = index
+        self._ids[label] = ids
+
+
+    def __len__(self):
+        "@return: The number of intervals in all the partitions."
+        return sum(len(index) for index in self._indexes.values())
+
+
+    def __contains__(self, label):
+        "@return: True iff there is a partition with the label."
+        return label in self._indexes
+
+
+    def labels(self):
+        "@return: The labels of the partitions."
+        return list(self._indexes.keys())
+
+
+    def partition(self, label):
+        "@return: The IntervalIndex of the partition with the label."
+        return self._indexes[label]
+
+
+    def overlap_counts(self, labels, starts, ends, processes=1):
+        """
+        Count the intervals that overlap each of the labelled queries, see IntervalIndex.overlap_counts().
+        The partitions are queried in a pool of processes unless processes is 1. If it is None
+        the pool has one process for each CPU. Each such call starts a new pool and pickles
+        each queried partition to the process that queries it, which takes time in proportion
+        to the size of those partitions, so a pool only pays off for large batches of queries.
+
+        @return: An array of the counts.
+        """
+        counts = numpy.zeros(len(starts), dtype=int)
+        for label, positions, result in self._query('overlap_counts', labels, starts, ends, processes):
+            counts[positions] = result
+        return counts
+
+
+    def overlaps(self, labels, starts, ends, processes=1, sort=True):
+        """
+        Find all the intervals that overlap each of the labelled queries, see IntervalIndex.overlaps()
+        and overlap_counts() for processes.
+
+        @return: Arrays iq and ids such that query iq[k] overlaps the interval with id ids[k]. If
+        sort is True the pairs are sorted by iq and then ids.
+        """
+        iq, ids = [numpy.zeros(0, dtype=int)], [numpy.zeros(0, dtype=int)]
+        for label, positions, (iq_label, ii_label) in self._query('overlaps', labels, starts, ends, processes):
+            iq.append(positions[iq_label])
+            ids.append(self._ids[label][ii_label])
+        iq = numpy.concatenate(iq)
+        ids = numpy.concatenate(ids)
+        if sort:
+            order = numpy.lexsort((ids, iq))
+            iq, ids = iq[order], ids[order]
+        return iq, ids
+
+
+    def nearest(self, labels, starts, ends, processes=1):
+        """
+        Find the interval in the same partition nearest each of the labelled queries, see
+        IntervalIndex.nearest() and overlap_counts() for processes.
+
+        @return: An array of the ids of the nearest intervals and an array of their distances.
+        The ids are -1 and the distances infinite where there are no intervals in the partition.
+        """
+        nearest = numpy.empty(len(starts), dtype=int)
+        nearest[:] = -1
+        distances = numpy.empty(len(starts))
+        distances[:] = numpy.inf
+        for label, positions, (nearest_label, distances_label) in self._query('nearest', labels, starts, ends, processes):
+            found = nearest_label >= 0
+            nearest[positions[found]] = self._ids[label][nearest_label[found]]
+            distances[positions] = distances_label
+        return nearest, distances
+
+
+    def _query(self, method, labels, starts, ends, processes):
+        """
+        Split the queries by label and call the method of each partition's index with them,
+        skipping labels that have no partition.
+
+        @return: A list of (label, positions of the queries, result) tuples.
+        """
+        starts = numpy.asarray(starts)
+        ends = numpy.asarray(ends)
+        if len(labels) != len(starts) or len(starts) != len(ends):
+            raise ValueError('There must be one label, start and end for each query')
+        groups = [(label, positions) for label, positions in _group_by_label(labels) if label in self._indexes]
+        tasks = [(self._indexes[label], method, starts[positions], ends[positions]) for label, positions in groups]
+        if 1 == processes or len(tasks) < 2:
+            results = [_query_worker(task) for task in tasks]
+        else:
+            if 'overlaps' == method:
+                # build the trees here so they are kept for later calls rather than built in the workers
+                for task in tasks:
+                    task[0]._get_centred_tree()
+            # each task sends only its partition to the worker that runs it
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(_query_worker, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        return [(label, positions, result) for (label, positions), result in zip(groups, results)]
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the PartitionedIntervalIndex against brute force
+    R.seed(2)
+    n, m = 300, 200
+    contigs = numpy.array(['chr1', 'chr2', 'chr3'])
+    labels = contigs[R.randint(0, 3, size=n)]
+    starts = R.randint(0, 1000, size=n)
+    ends = starts + R.poisson(20., size=n)
+    index = PartitionedIntervalIndex.from_records(labels, starts, ends)
+    q_labels = numpy.array(['chr1', 'chr2', 'chr3', 'chrX'])[R.randint(0, 4, size=m)]
+    q_starts = R.randint(0, 1000, size=m)
+    q_ends = q_starts + R.poisson(20., size=m)
+    overlapping = (
+        (labels[None, :] == q_labels[:, None])
+        & (starts[None, :] < q_ends[:, None])
+        & (q_starts[:, None] < ends[None, :]))
+    for processes in (1, 2):
+        counts = index.overlap_counts(q_labels, q_starts, q_ends, processes=processes)
+        assert (counts == overlapping.sum(axis=1)).all()
+        iq, ids = index.overlaps(q_labels, q_starts, q_ends, processes=processes)
+        assert list(zip(iq, ids)) == list(zip(*numpy.nonzero(overlapping)))
+        nearest, distances = index.nearest(q_labels, q_starts, q_ends, processes=processes)
+        assert ((nearest == -1) == (q_labels == 'chrX')).all()
+        found = nearest >= 0
+        assert (labels[nearest[found]] == q_labels[found]).all()
@@ -0,0 +1,470 @@
+#
+# Copyright John Reid 2009
+#
+
+"""
+A red-black tree whose nodes are stored in parallel typed arrays.
+
+Nodes are identified by integer ids that index the arrays. This uses a small
+fraction of the memory of :py:class:`cookbook.rbtree.rbtree` and the tree
+operations do not allocate any objects. Keys must be representable in the
+typecode given to the tree (by default double precision floats).
+"""
+
+
+from array import array
+from .rbtree import search_sorted
+import mmap as _mmap
+import struct
+import sys
+
+
+NIL = 0
+"The id of the nil node, used for all leaves."
+
+_MAGIC = b'RBTREE01'
+"Identifies files written by rbarraytree.save()."
+
+_HEADER = struct.Struct('<8scc6xqq')
+"The file header: magic, byte order, key typecode, number of keys and root."
+
+_COLUMNS = (('_key', None), ('_red', 'b'), ('_left', 'i'), ('_right', 'i'), ('_p', 'i'))
+"The arrays in the order they are saved and their typecodes (None for the key typecode)."
+
+
+class rbarraytree(object):
+    """
+    A red black tree stored in parallel arrays. See Cormen, Leiserson, Rivest, Stein 2nd edition pg 273.
+    """
+
+
+    def __init__(self, typecode='d'):
+        "Construct. The typecode is that of the array.array used to store the keys."
+
+        self._typecode = typecode
+        "The typecode of the keys."
+
+        self._key = array(typecode, [0])
+        "The nodes' keys."
+
+        self._red = array('b', [0])
+        "Are the nodes red?"
+
+        self._left = array('i', [NIL])
+        "The nodes' left children."
+
+        self._right = array('i', [NIL])
+        "The nodes' right children."
+
+        self._p = array('i', [NIL])
+        "The nodes' parents."
+
+        self._root = NIL
+        "The root of the tree."
+
+        self._keys_array = None
+        "A cached sorted array of the keys, see as_array()."
+
+        self._mmap = None
+        "The memory map the arrays are views of if the tree was loaded read-only."
+
+
+    root = property(fget=lambda self: self._root, doc="The tree's root node")
+    nil = property(fget=lambda self: NIL, doc="The tree's nil node")
+    typecode = property(fget=lambda self: self._typecode, doc="The typecode of the keys")
+
+
+    def __len__(self):
+        "@return: The number of keys in the tree."
+        return len(self._key) - 1
+
+
+    def __iter__(self):
+        "Iterate over the keys in order."
+        keys, left, right = self._key, self._left, self._right
+        stack = []
+        x = self._root
+        while stack or x != NIL:
+            if x != NIL:
+                stack.append(x)
+                x = left[x]
+            else:
+                x = stack.pop()
+                yield keys[x]
+                x = right[x]
+
+
+    def as_array(self):
+        """
+        @return: A read-only numpy array of the keys in order. The array is cached until
+        the tree is next modified.
+        """
+        if None is self._keys_array:
+            import numpy
+            self._keys_array = numpy.fromiter(self, dtype=self.typecode, count=len(self))
+            self._keys_array.flags.writeable = False
+        return self._keys_array
+
+
+    def search_many(self, keys, return_index=False):
+        """
+        Search for many keys at once with a vectorised binary search of as_array().
+
+        @return: A boolean array that is True where the keys are in the tree. If return_index is
+        True, also return an array of the number of keys in the tree less than each key.
+        """
+        return search_sorted(self.as_array(), keys, return_index)
+
+
+    def key(self, x):
+        "@return: The key of node x."
+        return self._key[x]
+
+
+    def red(self, x):
+        "@return: Is node x red?"
+        return bool(self._red[x])
+
+
+    def left(self, x):
+        "@return: The left child of node x."
+        return self._left[x]
+
+
+    def right(self, x):
+        "@return: The right child of node x."
+        return self._right[x]
+
+
+    def p(self, x):
+        "@return: The parent of node x."
+        return self._p[x]
+
+
+    def search(self, key, x=None):
+        """
+        Search the subtree rooted at x (or the root if not given) iteratively for the key.
+
+        @return: self.nil if it cannot find it.
+        """
+        if None == x:
+            x = self._root
+        keys, left, right = self._key, self._left, self._right
+        while x != NIL:
+            x_key = keys[x]
+            if key == x_key:
+                break
+            if key < x_key:
+                x = left[x]
+            else:
+                x = right[x]
+        return x
+
+
+    def minimum(self, x=None):
+        """
+        @return: The node with the minimum key in the subtree rooted at x.
+        """
+        if None == x:
+            x = self._root
+        left = self._left
+        while left[x] != NIL:
+            x = left[x]
+        return x
+
+
+    def maximum(self, x=None):
+        """
+        @return: The node with the maximum key in the subtree rooted at x.
+        """
+        if None == x:
+            x = self._root
+        right = self._right
+        while right[x] != NIL:
+            x = right[x]
+        return x
+
+
+    def insert_key(self, key):
+        "Insert the key into the tree. @return: The new node."
+        if None != self._mmap:
+            raise ValueError('Cannot insert into a memory mapped tree')
+        keys, left, right, p = self._key, self._left, self._right, self._p
+        self._keys_array = None
+        z = len(keys)
+        keys.append(key)
+        self._red.append(1)
+        left.append(NIL)
+        right.append(NIL)
+        y = NIL
+        x = self._root
+        while x != NIL:
+            y = x
+            if key < keys[x]:
+                x = left[x]
+            else:
+                x = right[x]
+        p.append(y)
+        if y == NIL:
+            self._root = z
+        elif key < keys[y]:
+            left[y] = z
+        else:
+            right[y] = z
+        self._insert_fixup(z)
+        return z
+
+
+    @classmethod
+    def from_sorted(cls, keys, assume_sorted=True, typecode='d'):
+        """
+        Build a tree from the keys in linear time. The keys are sorted first unless
+        assume_sorted is True, in which case a ValueError is raised if they are not sorted.
+
+        @return: The tree.
+        """
+        t = cls(typecode=typecode)
+        if not assume_sorted:
+            keys = sorted(keys)
+        t._key.extend(keys)
+        n = len(t._key) - 1
+        if assume_sorted:
+            for x in range(2, n + 1):
+                if t._key[x] < t._key[x-1]:
+                    raise ValueError('Keys are not sorted: %s follows %s' % (t._key[x], t._key[x-1]))
+
+        # node x holds the x'th smallest key, link them into a perfectly balanced
+        # tree with the deepest level red, see rbtree._build_from_sorted()
+        t._red.extend(0 for x in range(n))
+        t._left.extend(NIL for x in range(n))
+        t._right.extend(NIL for x in range(n))
+        t._p.extend(NIL for x in range(n))
+        red_depth = n.bit_length() - 1
+        stack = [(1, n + 1, 0, NIL, 0)]
+        while stack:
+            lo, hi, depth, parent, is_right = stack.pop()
+            if lo == hi:
+                continue
+            x = (lo + hi) // 2
+            t._p[x] = parent
+            if parent == NIL:
+                t._root = x
+            elif is_right:
+                t._right[parent] = x
+            else:
+                t._left[parent] = x
+            t._red[x] = depth == red_depth and depth > 0
+            stack.append((lo, x, depth + 1, x, 0))
+            stack.append((x + 1, hi, depth + 1, x, 1))
+        return t
+
+
+    @classmethod
+    def from_tree(cls, t, typecode='d'):
+        """
+        Copy the tree t, for example a cookbook.rbtree.rbtree, keeping its shape and colours.
+        Its keys must be representable in the typecode.
+
+        @return: The tree.
+        """
+        a = cls(typecode=typecode)
+        ids = {}
+        nodes = list(t.iter_range())
+        for x, node in enumerate(nodes, 1):
+            ids[id(node)] = x
+        ids[id(t.nil)] = NIL
+        nil_id = lambda node: ids[id(node)]
+        a._key.extend(node.key for node in nodes)
+        a._red.extend(node.red and 1 or 0 for node in nodes)
+        a._left.extend(nil_id(node.left) for node in nodes)
+        a._right.extend(nil_id(node.right) for node in nodes)
+        a._p.extend(nil_id(node.p) for node in nodes)
+        a._root = nil_id(t.root)
+        return a
+
+
+    def save(self, path):
+        """
+        Save the tree in a compact binary format that load() can memory map. The arrays are
+        written in the machine's byte order.
+        """
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(
+                _MAGIC, sys.byteorder[0].encode('ascii'), self.typecode.encode('ascii'), len(self), self._root))
+            for name, typecode in _COLUMNS:
+                column = getattr(self, name)
+                f.write(column.tobytes())
+                f.write(b'\0' * (-len(column) * column.itemsize % 8))
+
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a tree written by save(). If mmap is True, the file is memory mapped and the
+        tree reads its arrays directly from the mapping so loading is very quick, but
+        the tree cannot be modified. Otherwise the arrays are read into memory.
+
+        @return: The tree.
+        """
+        with open(path, 'rb') as f:
+            if mmap:
+                buf = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+            else:
+                buf = f.read()
+        view = memoryview(buf)
+        magic, byteorder, typecode, n, root = _HEADER.unpack_from(view)
+        if _MAGIC != magic:
+            raise ValueError('%s was not written by rbarraytree.save()' % path)
+        if sys.byteorder[0].encode('ascii') != byteorder:
+            raise ValueError('%s was written on a machine with a different byte order' % path)
+        typecode = typecode.decode('ascii')
+        t = cls(typecode=typecode)
+        offset = _HEADER.size
+        for name, column_typecode in _COLUMNS:
+            column_typecode = column_typecode or typecode
+            nbytes = (n + 1) * array(column_typecode).itemsize
+            column = view[offset:offset + nbytes]
+            if mmap:
+                column = column.cast(column_typecode)
+            else:
+                column = array(column_typecode, column.tobytes())
+            setattr(t, name, column)
+            offset += nbytes + (-nbytes % 8)
+        t._root = root
+        if mmap:
+            t._mmap = buf
+        return t
+
+
+    def _insert_fixup(self, z):
+        "Restore red-black properties after insert."
+        red, left, right, p = self._red, self._left, self._right, self._p
+        while red[p[z]]:
+            zp = p[z]
+            zpp = p[zp]
+            if zp == left[zpp]:
+                y = right[zpp]
+                if red[y]:
+                    red[zp] = 0
+                    red[y] = 0
+                    red[zpp] = 1
+                    z = zpp
+                else:
+                    if z == right[zp]:
+                        z = zp
+                        self._left_rotate(z)
+                        zp = p[z]
+                        zpp = p[zp]
+                    red[zp] = 0
+                    red[zpp] = 1
+                    self._right_rotate(zpp)
+            else:
+                y = left[zpp]
+                if red[y]:
+                    red[zp] = 0
+                    red[y] = 0
+                    red[zpp] = 1
+                    z = zpp
+                else:
+                    if z == left[zp]:
+                        z = zp
+                        self._right_rotate(z)
+                        zp = p[z]
+                        zpp = p[zp]
+                    red[zp] = 0
+                    red[zpp] = 1
+                    self._left_rotate(zpp)
+        red[self._root] = 0
+
+
+    def _left_rotate(self, x):
+        "Left rotate x."
+        left, right, p = self._left, self._right, self._p
+        y = right[x]
+        right[x] = left[y]
+        if left[y] != NIL:
+            p[left[y]] = x
+        xp = p[x]
+        p[y] = xp
+        if xp == NIL:
+            self._root = y
+        elif x == left[xp]:
+            left[xp] = y
+        else:
+            right[xp] = y
+        left[y] = x
+        p[x] = y
+
+
+    def _right_rotate(self, y):
+        "Right rotate y."
+        left, right, p = self._left, self._right, self._p
+        x = left[y]
+        left[y] = right[x]
+        if right[x] != NIL:
+            p[right[x]] = y
+        yp = p[y]
+        p[x] = yp
+        if yp == NIL:
+            self._root = x
+        elif y == right[yp]:
+            right[yp] = x
+        else:
+            left[yp] = x
+        right[x] = y
+        p[y] = x
+
+
+    def check_invariants(self):
+        "@return: True iff satisfies all criteria to be red-black tree."
+        keys, red, left, right, p = self._key, self._red, self._left, self._right, self._p
+        if red[NIL] or red[self._root]:
+            return False
+        if self._root != NIL and p[self._root] != NIL:
+            return False
+
+        # walk the tree with an explicit stack, recording the black height
+        # of the path to each node and the black height of the leaves
+        leaf_black_height = None
+        stack = [(self._root, 0)]
+        while stack:
+            x, black_height = stack.pop()
+            if x == NIL:
+                if None == leaf_black_height:
+                    leaf_black_height = black_height
+                elif leaf_black_height != black_height:
+                    return False
+                continue
+            if not red[x]:
+                black_height += 1
+            for child in (left[x], right[x]):
+                if child != NIL:
+                    if p[child] != x:
+                        return False
+                    if red[x] and red[child]:
+                        return False
+                stack.append((child, black_height))
+            if left[x] != NIL and keys[x] < keys[left[x]]:
+                return False
+            if right[x] != NIL and keys[right[x]] < keys[x]:
+                return False
+        return True
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the rbarraytree
+    R.seed(2)
+    size = 50
+    keys = R.randint(-50, 50, size=size)
+    t = rbarraytree()
+    assert t.check_invariants()
+    for i, key in enumerate(keys):
+        t.insert_key(key)
+        assert t.check_invariants()
+        for key2 in keys[:i+1]:
+            assert t.nil != t.search(key2)
+    assert t.key(t.minimum()) == min(keys)
+    assert t.key(t.maximum()) == max(keys)
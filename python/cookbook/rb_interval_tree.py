@@ -10,8 +10,16 @@ An augmented red-black tree that handles intervals.
 
 
 from .rbtree import rbnode, rbtree, write_tree_as_dot, test_tree
-from cookbook.interval import Interval
-import logging
+from cookbook.interval import Interval, sort_key
+import heapq, logging
+
+
+def _max_ignoring_none(*values):
+    "@return: The maximum of those values that are not None, or None if there are none."
+    values = [v for v in values if None != v]
+    if values:
+        return max(values)
+    return None
 
 
 class rbintervalnode(rbnode):
@@ -23,8 +31,10 @@ class rbintervalnode(rbnode):
         "Construct."
         rbnode.__init__(self, key)
         self._max = self._key_max()
+        self._value = None
 
     max = property(fget=lambda self: self._max, doc="The maximum value of any endpoint in the subtree rooted at this node.")
+    value = property(fget=lambda self: self._value, doc="The payload stored with the node's interval.")
 
     def _key_max(self):
         "@return: The maximum of the key of this node."
@@ -35,7 +45,7 @@ class rbintervalnode(rbnode):
 
     def _set_max_locally(self):
         "Use local information (i.e. children) to set max."
-        self._max = max(self._key_max(), self.left.max, self.right.max)
+        self._max = _max_ignoring_none(self._key_max(), self.left.max, self.right.max)
 
     def __str__(self):
         "String representation."
@@ -62,7 +72,35 @@ class rbintervaltree(rbtree):
 
     def __init__(self):
         "Construct."
-        rbtree.__init__(self, create_node=rbintervalnode)
+        rbtree.__init__(self, create_node=rbintervalnode, key=sort_key)
+
+
+    def insert_key(self, key, value=None):
+        "Insert the interval into the tree with value as its payload. @return: The new node."
+        z = self._create_node(key=key)
+        z._value = value
+        self.insert_node(z)
+        return z
+
+
+    def update_interval(self, x, i):
+        """
+        Change the interval of node x to i, keeping the node and its payload. If i keeps x in
+        order with its neighbours the key is replaced in place and max is repaired on the path
+        to the root, otherwise x is removed and inserted again. Both take O(log n) time.
+        """
+        sort_key = self._sort_key_of(i)
+        before = self.predecessor(x)
+        after = self.successor(x)
+        if (before == self.nil or not sort_key < before._sort_key) and (after == self.nil or not after._sort_key < sort_key):
+            x._key = i
+            x._sort_key = sort_key
+            self._update_path(x)
+            self._modified()
+        else:
+            self.delete_node(x)
+            x._key = i
+            self.insert_node(x)
 
 
     def interval_search(self, i):
@@ -76,6 +114,61 @@ class rbintervaltree(rbtree):
         return x
 
 
+    def overlapping(self, i):
+        """
+        Iterate over the nodes whose intervals overlap i in order of their keys. Subtrees whose
+        max is not greater than i.start are skipped and the walk stops at the first node that
+        starts at or after i.end. Each overlap may cost a walk down from a pruned subtree so
+        this takes O(min(n, (k + 1) log n)) time for k overlaps, not O(log n + k): a few long
+        intervals among many short ones keep subtrees' max high and little can be skipped.
+        The tree must not be modified during the iteration.
+        """
+        start, end = i.start, i.end
+        nil = self.nil
+        stack = []
+        x = self.root
+        while stack or x != nil:
+            if x != nil:
+                if x.max <= start:
+                    # nothing in this subtree ends after i starts
+                    x = nil
+                else:
+                    stack.append(x)
+                    x = x.left
+            else:
+                x = stack.pop()
+                if not x.key.start < end:
+                    # this and all later intervals start after i
+                    return
+                if start < x.key.end:
+                    yield x
+                x = x.right
+
+
+    def stabbing(self, point):
+        """
+        Iterate over the nodes whose intervals contain the point in order of their keys, see
+        overlapping(). The tree must not be modified during the iteration.
+        """
+        nil = self.nil
+        stack = []
+        x = self.root
+        while stack or x != nil:
+            if x != nil:
+                if x.max <= point:
+                    x = nil
+                else:
+                    stack.append(x)
+                    x = x.left
+            else:
+                x = stack.pop()
+                if point < x.key.start:
+                    return
+                if point < x.key.end:
+                    yield x
+                x = x.right
+
+
     def _propagate_augmented(self, z):
         "Propagate any changes to the augmented data up the tree."
         z._set_max_locally()
@@ -83,10 +176,20 @@ class rbintervaltree(rbtree):
             z.p._max = max(z.p.max, z.max)
             z = z.p
 
+    def _update_node(self, x):
+        "Set x's max from its key and children."
+        x._set_max_locally()
+
+    def _update_path(self, x):
+        "Set the max of x and all its ancestors, e.g. after a node has been removed below x."
+        while x != self.nil:
+            x._set_max_locally()
+            x = x.p
+
     def _insert_fixup(self, z):
         "Restore max invariant properties after insert."
         self._propagate_augmented(z)
-        rbtree._insert_fixup(self, z)
+        return rbtree._insert_fixup(self, z)
 
     def _left_rotate(self, x):
         "Left rotate and keep max values correct."
@@ -102,18 +205,67 @@ class rbintervaltree(rbtree):
         y._set_max_locally()
 
 
-    def check_invariants(self):
-        "Check the max invariant of the nodes and the red-black properties."
-        def check_node(x):
-            if self.nil == x:
-                return x.max == None
-            else:
-                if x.max != max(x._key_max(), x.left.max, x.right.max):
-                    assert False
-                    return False
-                return check_node(x.left) and check_node(x.right)
+    def _check_node(self, x):
+        "@return: True iff x's max is consistent with its key and children."
+        return x.max == _max_ignoring_none(x._key_max(), x.left.max, x.right.max)
+
 
-        return check_node(self.root) and rbtree.check_invariants(self)
+
+    def nearest(self, i, k=1, max_distance=None):
+        """
+        Find the k nodes whose intervals are nearest to i. The distance between two intervals
+        is 0 if they overlap or touch, otherwise it is the size of the gap between them. The
+        tree is searched with an explicit stack, skipping subtrees whose max or start shows
+        they cannot hold anything nearer than the k'th nearest interval found so far.
+
+        @return: A list of up to k (distance, node) pairs sorted by distance and then by key.
+        Intervals further than max_distance from i are not included if it is given. The list
+        is empty if k is not positive.
+        """
+        if k <= 0:
+            return []
+        start, end = i.start, i.end
+        nil = self.nil
+        if None == max_distance:
+            max_distance = float('infinity')
+        heap = []  # the nearest so far as (-distance, count, node) so the furthest is at the top
+        count = 0
+        stack = [(self.root, 0)]
+        while stack:
+            x, lower_bound = stack.pop()
+            if x == nil or lower_bound > max_distance:
+                continue
+            if len(heap) == k and lower_bound >= -heap[0][0]:
+                continue
+            x_start = x.key.start
+            distance = max(0, x_start - end, start - x.key.end)
+            if distance <= max_distance:
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, count, x))
+                    count += 1
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, count, x))
+                    count += 1
+            left, right = x.left, x.right
+            left_bound = right_bound = None
+            if left != nil:
+                left_bound = max(0, start - left.max)
+            if right != nil:
+                right_bound = max(0, x_start - end, start - right.max)
+            # visit the more promising subtree first
+            if None == left_bound:
+                stack.append((right, right_bound))
+            elif None == right_bound:
+                stack.append((left, left_bound))
+            elif left_bound < right_bound:
+                stack.append((right, right_bound))
+                stack.append((left, left_bound))
+            else:
+                stack.append((left, left_bound))
+                stack.append((right, right_bound))
+        return sorted(
+            ((-d, x) for d, c, x in heap),
+            key=lambda item: (item[0], item[1]._sort_key))
 
 
 
@@ -169,3 +321,10 @@ if '__main__' == __name__:
     test_tree(interval_tree, intervals)
     write_tree(interval_tree, 'interval_tree')
     print(interval_tree.find_closest_intervals(Interval(3,30), max_distance=None))
+    print(interval_tree.nearest(Interval(3,30), k=3))
+    x = interval_tree.insert_key(Interval(0, 10), value='payload')
+    interval_tree.update_interval(x, Interval(6000, 6010))
+    assert interval_tree.check_invariants() and interval_tree.maximum() == x and 'payload' == x.value
+    query = Interval(-1000, 1000)
+    assert [x.key for x in interval_tree.overlapping(query)] == sorted(
+        (i for i in intervals if i.start < query.end and query.start < i.end), key=sort_key)
@@ -0,0 +1,342 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+A red-black tree augmented with subtree sizes to answer order statistic queries.
+"""
+
+
+from .rbtree import rbnode, rbtree, write_tree_as_dot, test_tree
+
+
+class rbosnode(rbnode):
+    """
+    A node of an order statistic red black tree.
+    """
+
+    _count = 1
+    "The number of times the node's key is in the tree."
+
+    def __init__(self, key):
+        "Construct."
+        rbnode.__init__(self, key)
+        if None == key:
+            self._size = 0
+        else:
+            self._size = 1
+
+    size = property(fget=lambda self: self._size, doc="The number of nodes in the subtree rooted at this node.")
+
+    def _set_size_locally(self):
+        "Use local information (i.e. children) to set size."
+        self._size = self._count + self.left.size + self.right.size
+
+    def __str__(self):
+        "String representation."
+        return '%s; size=%s' % (self.key, self.size)
+
+
+    def __repr__(self):
+        "String representation."
+        return '%s; size=%s' % (self.key, self.size)
+
+
+
+
+
+class rbostree(rbtree):
+    """
+    An order statistic red black tree. See Cormen, Leiserson, Rivest, Stein 2nd edition pg 302.
+    """
+
+
+    def __init__(self, create_node=rbosnode, key=None):
+        "Construct."
+        rbtree.__init__(self, create_node=create_node, key=key)
+
+
+    def __len__(self):
+        "@return: The number of nodes in the tree."
+        return self.root.size
+
+
+    def select(self, i):
+        """
+        @return: The node with the i'th smallest key (counting from 0). Negative i
+        count back from the largest key as for lists.
+        @raise IndexError: If i is out of range.
+        """
+        x = self.root
+        if i < 0:
+            i += x.size
+        if not 0 <= i < x.size:
+            raise IndexError('Index out of range: %s' % i)
+        while True:
+            r = x.left.size
+            if i < r:
+                x = x.left
+            elif i < r + x._count:
+                return x
+            else:
+                i -= r + x._count
+                x = x.right
+
+
+    def rank(self, key):
+        "@return: The number of keys in the tree less than key."
+        key = self._sort_key_of(key)
+        r = 0
+        x = self.root
+        while x != self.nil:
+            if x._sort_key < key:
+                r += x.left.size + x._count
+                x = x.right
+            else:
+                x = x.left
+        return r
+
+
+    def node_rank(self, x):
+        "@return: The position of node x in an in-order walk of the tree (counting from 0)."
+        r = x.left.size
+        while x != self.root:
+            if x == x.p.right:
+                r += x.p.left.size + x.p._count
+            x = x.p
+        return r
+
+
+    def count_range(self, lo, hi):
+        "@return: The number of keys in the half-open range [lo, hi)."
+        return max(0, self.rank(hi) - self.rank(lo))
+
+
+    def _update_node(self, x):
+        "Set x's size from its children."
+        x._set_size_locally()
+
+    def _update_path(self, x):
+        "Set the size of x and all its ancestors, e.g. after a node has been removed below x."
+        while x != self.nil:
+            x._set_size_locally()
+            x = x.p
+
+    def _insert_fixup(self, z):
+        "Count z in the sizes of its ancestors and restore red-black properties after insert."
+        y = z.p
+        while y != self.nil:
+            y._size += 1
+            y = y.p
+        return rbtree._insert_fixup(self, z)
+
+    def _left_rotate(self, x):
+        "Left rotate and keep sizes correct."
+        rbtree._left_rotate(self, x)
+        x.p._size = x.size
+        x._set_size_locally()
+
+
+    def _right_rotate(self, y):
+        "Right rotate and keep sizes correct."
+        rbtree._right_rotate(self, y)
+        y.p._size = y.size
+        y._set_size_locally()
+
+
+    def _check_node(self, x):
+        "@return: True iff x's size is consistent with its children."
+        return x.size == x._count + x.left.size + x.right.size
+
+
+
+class rbmultisetnode(rbosnode):
+    """
+    A node of a multiset red black tree that holds all the copies of its key.
+    """
+
+    def __init__(self, key):
+        "Construct."
+        if None == key:
+            self._count = 0
+        else:
+            self._count = 1
+        rbosnode.__init__(self, key)
+
+    count = property(fget=lambda self: self._count, doc="The number of times the node's key is in the tree.")
+
+    def __str__(self):
+        "String representation."
+        return '%s; count=%s; size=%s' % (self.key, self.count, self.size)
+
+
+    def __repr__(self):
+        "String representation."
+        return '%s; count=%s; size=%s' % (self.key, self.count, self.size)
+
+
+
+
+
+class rbmultiset(rbostree):
+    """
+    An order statistic red black tree that stores each distinct key once with a count of
+    how many times it has been inserted. Inserting a key that is already in the tree just
+    increments its count. Sizes, select() and rank() count every copy of a key, whereas
+    iter_range() and the other node queries visit each distinct key once.
+    """
+
+
+    def __init__(self, create_node=rbmultisetnode, key=None):
+        "Construct."
+        rbostree.__init__(self, create_node=create_node, key=key)
+
+
+    def __iter__(self):
+        "Iterate over the keys in order, repeating each as many times as it is in the tree."
+        for x in self.iter_range():
+            for i in range(x._count):
+                yield x.key
+
+
+    def __reversed__(self):
+        "Iterate over the keys in reverse order, repeating each as many times as it is in the tree."
+        for x in self.iter_range(reverse=True):
+            for i in range(x._count):
+                yield x.key
+
+
+    def count(self, key):
+        "@return: The number of times the key is in the tree."
+        return self.search(key)._count
+
+
+    def insert_key(self, key):
+        """
+        Insert the key into the tree, incrementing its count if it is already there.
+
+        @return: The key's node.
+        """
+        x = self.search(key)
+        if x == self.nil:
+            return rbostree.insert_key(self, key)
+        self._add_to_count(x, 1)
+        return x
+
+
+    def delete_key(self, key):
+        """
+        Delete one copy of the key from the tree, removing its node if it was the last.
+
+        @return: The key's node.
+        @raise KeyError: If the key is not in the tree.
+        """
+        x = self.search(key)
+        if x == self.nil:
+            raise KeyError(key)
+        if x._count > 1:
+            self._add_to_count(x, -1)
+        else:
+            self.delete_node(x)
+        return x
+
+
+    def delete_range(self, lo, hi):
+        """
+        Delete the keys in the half-open range [lo, hi).
+
+        @return: The number of keys deleted, counting every copy.
+        """
+        size = len(self)
+        rbostree.delete_range(self, lo, hi)
+        return size - len(self)
+
+
+    def join(self, key, other):
+        "Join the key and the other tree on to the right of this tree, see rbtree.join()."
+        rbostree.join(self, key, other)
+        self._combine_copies(self._lower_bound(self._sort_key_of(key)))
+
+
+    def _add_to_count(self, x, n):
+        "Add n to the count of node x and the sizes of its ancestors."
+        x._count += n
+        while x != self.nil:
+            x._size += n
+            x = x.p
+        self._modified()
+
+
+    def _combine_copies(self, x):
+        "Move the counts of the nodes after x with the same sort key into x and delete them."
+        y = self.successor(x)
+        while y != self.nil and y._sort_key == x._sort_key:
+            self._add_to_count(x, y._count)
+            self.delete_node(y)
+            y = self.successor(x)
+
+
+    def _build_from_sorted(self, keys, sort_keys):
+        "Replace the tree with a perfectly balanced one holding one node for each distinct key."
+        nodes = []
+        for key, sort_key in zip(keys, sort_keys):
+            if nodes and nodes[-1]._sort_key == sort_key:
+                nodes[-1]._count += 1
+            else:
+                x = self._create_node(key=key)
+                x._sort_key = sort_key
+                nodes.append(x)
+        self._link_sorted_nodes(nodes)
+
+
+    def _union(self, x, x_bh, t, t_bh):
+        """
+        Merge the detached subtrees rooted at x and t by splitting t around x's key, moving
+        the count of any node in t with the same key into x.
+
+        @return: The root and black height of the merged subtree.
+        """
+        if x == self.nil:
+            return t, t_bh
+        if t == self.nil:
+            return x, x_bh
+        l, r, child_bh = self._detach_children(x, x_bh)
+        tl, tl_bh, tr, tr_bh = self._split(t, t_bh, x._sort_key)
+        if tr != self.nil:
+            self._set_root(tr)
+            y = self.minimum()
+            if y._sort_key == x._sort_key:
+                x._count += y._count
+                self.delete_node(y)
+                tr = self.root
+                tr_bh = self._black_height(tr)
+        l, l_bh = self._union(l, child_bh, tl, tl_bh)
+        r, r_bh = self._union(r, child_bh, tr, tr_bh)
+        return self._join(l, l_bh, x, r, r_bh)
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the rbostree
+    R.seed(2)
+    size = 50
+    keys = R.randint(-50, 50, size=size)
+    t = rbostree()
+    test_tree(t, keys)
+    sorted_keys = sorted(keys)
+    for i, key in enumerate(sorted_keys):
+        assert t.select(i).key == key
+        assert t.rank(key) == sorted_keys.index(key)
+
+    # test the rbmultiset
+    t = rbmultiset()
+    test_tree(t, keys)
+    assert list(t) == sorted_keys
+    for i, key in enumerate(sorted_keys):
+        assert t.select(i).key == key
+        assert t.rank(key) == sorted_keys.index(key)
+        assert t.count(key) == sorted_keys.count(key)
@@ -0,0 +1,226 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+A persistent red-black tree. Inserting a key copies the path from the root to the new
+node and shares all other subtrees with the previous version of the tree, so old
+versions remain valid and can be read while the tree is being written to.
+"""
+
+
+class rbpersistentnode(object):
+    """
+    An immutable node in a persistent red black tree.
+    """
+
+    __slots__ = ('_key', '_red', '_left', '_right')
+
+    def __init__(self, key, red, left, right):
+        "Construct."
+        self._key = key
+        self._red = red
+        self._left = left
+        self._right = right
+
+    key = property(fget=lambda self: self._key, doc="The node's key")
+    red = property(fget=lambda self: self._red, doc="Is the node red?")
+    left = property(fget=lambda self: self._left, doc="The node's left child")
+    right = property(fget=lambda self: self._right, doc="The node's right child")
+
+    def __str__(self):
+        "String representation."
+        return str(self.key)
+
+
+    def __repr__(self):
+        "String representation."
+        return str(self.key)
+
+
+
+NIL = rbpersistentnode(None, False, None, None)
+"The nil node shared by all persistent trees, used for all leaves."
+
+
+
+def _balance(red, l, key, r):
+    """
+    @return: A new node with the given contents, rebalanced if it is black and has a red child
+    with a red child. See Okasaki, Red-black trees in a functional setting, 1999.
+    """
+    if not red:
+        if l._red:
+            if l._left._red:
+                return rbpersistentnode(
+                    l._key, True,
+                    rbpersistentnode(l._left._key, False, l._left._left, l._left._right),
+                    rbpersistentnode(key, False, l._right, r))
+            if l._right._red:
+                return rbpersistentnode(
+                    l._right._key, True,
+                    rbpersistentnode(l._key, False, l._left, l._right._left),
+                    rbpersistentnode(key, False, l._right._right, r))
+        if r._red:
+            if r._left._red:
+                return rbpersistentnode(
+                    r._left._key, True,
+                    rbpersistentnode(key, False, l, r._left._left),
+                    rbpersistentnode(r._key, False, r._left._right, r._right))
+            if r._right._red:
+                return rbpersistentnode(
+                    r._key, True,
+                    rbpersistentnode(key, False, l, r._left),
+                    rbpersistentnode(r._right._key, False, r._right._left, r._right._right))
+    return rbpersistentnode(key, red, l, r)
+
+
+
+class rbpersistenttree(object):
+    """
+    A persistent red black tree. Readers should take a snapshot() which is not affected
+    by later inserts. Taking a snapshot is O(1) and does not copy any nodes.
+    """
+
+
+    def __init__(self, root=NIL):
+        "Construct a tree with the given root."
+
+        self._root = root
+        "The root of the tree."
+
+
+    root = property(fget=lambda self: self._root, doc="The tree's root node")
+    nil = property(fget=lambda self: NIL, doc="The tree's nil node")
+
+
+    def snapshot(self):
+        "@return: A tree holding the current version of this tree."
+        return rbpersistenttree(self._root)
+
+
+    def search(self, key, x=None):
+        """
+        Search the subtree rooted at x (or the root if not given) iteratively for the key.
+
+        @return: self.nil if it cannot find it.
+        """
+        if None == x:
+            x = self._root
+        while x != NIL and key != x._key:
+            if key < x._key:
+                x = x._left
+            else:
+                x = x._right
+        return x
+
+
+    def minimum(self, x=None):
+        """
+        @return: The minimum value in the subtree rooted at x.
+        """
+        if None == x:
+            x = self._root
+        while x._left != NIL:
+            x = x._left
+        return x
+
+
+    def maximum(self, x=None):
+        """
+        @return: The maximum value in the subtree rooted at x.
+        """
+        if None == x:
+            x = self._root
+        while x._right != NIL:
+            x = x._right
+        return x
+
+
+    def __iter__(self):
+        "Iterate over the keys in order."
+        stack = []
+        x = self._root
+        while stack or x != NIL:
+            if x != NIL:
+                stack.append(x)
+                x = x._left
+            else:
+                x = stack.pop()
+                yield x._key
+                x = x._right
+
+
+    def insert_key(self, key):
+        """
+        Insert the key into the tree by copying the path to its position. Snapshots
+        taken earlier are not affected.
+
+        @return: The new root.
+        """
+        path = []
+        x = self._root
+        while x != NIL:
+            went_left = key < x._key
+            path.append((x, went_left))
+            if went_left:
+                x = x._left
+            else:
+                x = x._right
+        z = rbpersistentnode(key, True, NIL, NIL)
+        for x, went_left in reversed(path):
+            if went_left:
+                z = _balance(x._red, z, x._key, x._right)
+            else:
+                z = _balance(x._red, x._left, x._key, z)
+        if z._red:
+            z = rbpersistentnode(z._key, False, z._left, z._right)
+        self._root = z
+        return z
+
+
+    def check_invariants(self):
+        "@return: True iff satisfies all criteria to be red-black tree."
+        if NIL._red or self._root._red:
+            return False
+        leaf_black_height = None
+        stack = [(self._root, 0)]
+        while stack:
+            x, black_height = stack.pop()
+            if x == NIL:
+                if None == leaf_black_height:
+                    leaf_black_height = black_height
+                elif leaf_black_height != black_height:
+                    return False
+                continue
+            if not x._red:
+                black_height += 1
+            elif x._left._red or x._right._red:
+                return False
+            if x._left != NIL and x._key < x._left._key:
+                return False
+            if x._right != NIL and x._right._key < x._key:
+                return False
+            stack.append((x._left, black_height))
+            stack.append((x._right, black_height))
+        return True
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the rbpersistenttree
+    R.seed(2)
+    size = 50
+    keys = R.randint(-50, 50, size=size)
+    t = rbpersistenttree()
+    snapshots = []
+    for key in keys:
+        snapshots.append(t.snapshot())
+        t.insert_key(key)
+        assert t.check_invariants()
+    for i, snapshot in enumerate(snapshots):
+        assert list(snapshot) == sorted(keys[:i])
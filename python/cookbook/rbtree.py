@@ -6,7 +6,7 @@ A red-black tree implementation.
 """
 
 
-import six
+import copy
 
 
 class rbnode(object):
@@ -17,12 +17,14 @@ class rbnode(object):
     def __init__(self, key):
         "Construct."
         self._key = key
+        self._sort_key = key
         self._red = False
         self._left = None
         self._right = None
         self._p = None
 
     key = property(fget=lambda self: self._key, doc="The node's key")
+    sort_key = property(fget=lambda self: self._sort_key, doc="The key the node is ordered by, see rbtree's key argument")
     red = property(fget=lambda self: self._red, doc="Is the node red?")
     left = property(fget=lambda self: self._left, doc="The node's left child")
     right = property(fget=lambda self: self._right, doc="The node's right child")
@@ -45,14 +47,65 @@ class rbnode(object):
 
 
 
+class rbcursor(object):
+    """
+    A position in a red black tree that can be moved backwards and forwards. A cursor
+    stays valid while other nodes are inserted or deleted so a scan can be paused and
+    resumed. It is exhausted when it reaches the tree's nil node.
+    """
+
+    def __init__(self, tree, node):
+        "Construct."
+        self._tree = tree
+        self._node = node
+
+    node = property(fget=lambda self: self._node, doc="The node the cursor is at")
+    key = property(fget=lambda self: self._node.key, doc="The key of the node the cursor is at")
+
+    def valid(self):
+        "@return: True iff the cursor is at a node of the tree."
+        return self._node != self._tree.nil
+
+    def next(self):
+        "Move to the next node. @return: True iff the cursor is still valid."
+        self._node = self._tree.successor(self._node)
+        return self.valid()
+
+    def prev(self):
+        "Move to the previous node. @return: True iff the cursor is still valid."
+        self._node = self._tree.predecessor(self._node)
+        return self.valid()
+
+    def seek(self, key):
+        "Move to the first node whose key is not less than key."
+        self._node = self._tree._lower_bound(self._tree._sort_key_of(key))
+
+    def __iter__(self):
+        """
+        Iterate forwards over the nodes from the cursor's position. The cursor moves past each
+        node as it is yielded so breaking out of the loop leaves it ready to resume the scan.
+        """
+        while self._node != self._tree.nil:
+            x = self._node
+            self._node = self._tree.successor(x)
+            yield x
+
+
+
+
+
 class rbtree(object):
     """
     A red black tree. See Cormen, Leiserson, Rivest, Stein 2nd edition pg 273.
     """
 
 
-    def __init__(self, create_node=rbnode):
-        "Construct."
+    def __init__(self, create_node=rbnode, key=None):
+        """
+        Construct. If key is given, nodes are ordered by the result of calling it on their keys
+        rather than by the keys themselves. It is called once for each node and the result is
+        cached on the node so searches compare these cheaper sort keys.
+        """
 
         self._nil = create_node(key=None)
         "Our nil node, used for all leaves."
@@ -63,11 +116,27 @@ class rbtree(object):
         self._create_node = create_node
         "A callable that creates a node."
 
+        self._key_func = key
+        "A callable that maps keys to the keys nodes are ordered by, or None."
+
+        self._keys_array = None
+        "A cached sorted array of the keys, see as_array()."
+
+        self._sort_keys_array = None
+        "A cached sorted array of the sort keys, see search_many()."
+
 
     root = property(fget=lambda self: self._root, doc="The tree's root node")
     nil = property(fget=lambda self: self._nil, doc="The tree's nil node")
 
 
+    def _sort_key_of(self, key):
+        "@return: The key that a node with the given key is ordered by."
+        if None == self._key_func:
+            return key
+        return self._key_func(key)
+
+
     def search(self, key, x=None):
         """
         Search the subtree rooted at x (or the root if not given) iteratively for the key.
@@ -76,8 +145,9 @@ class rbtree(object):
         """
         if None == x:
             x = self.root
-        while x != self.nil and key != x.key:
-            if key < x.key:
+        key = self._sort_key_of(key)
+        while x != self.nil and key != x._sort_key:
+            if key < x._sort_key:
                 x = x.left
             else:
                 x = x.right
@@ -106,36 +176,283 @@ class rbtree(object):
         return x
 
 
+    def successor(self, x):
+        """
+        @return: The node following x in key order or self.nil if x is the maximum.
+        """
+        if x.right != self.nil:
+            return self.minimum(x.right)
+        y = x.p
+        while y != self.nil and x == y.right:
+            x = y
+            y = y.p
+        return y
+
+
+    def predecessor(self, x):
+        """
+        @return: The node preceding x in key order or self.nil if x is the minimum.
+        """
+        if x.left != self.nil:
+            return self.maximum(x.left)
+        y = x.p
+        while y != self.nil and x == y.left:
+            x = y
+            y = y.p
+        return y
+
+
+    def __iter__(self):
+        "Iterate over the keys in order."
+        for x in self.iter_range():
+            yield x.key
+
+
+    def __reversed__(self):
+        "Iterate over the keys in reverse order."
+        for x in self.iter_range(reverse=True):
+            yield x.key
+
+
+    def iter_range(self, lo=None, hi=None, reverse=False):
+        """
+        Iterate over the nodes whose keys lie in the half-open range [lo, hi), in
+        order or in reverse order. Either bound may be None to leave that end of
+        the range open. The next node is found when each node is yielded, so the
+        yielded node may be deleted without disturbing the iteration.
+        """
+        if None != lo:
+            lo = self._sort_key_of(lo)
+        if None != hi:
+            hi = self._sort_key_of(hi)
+        if reverse:
+            if None == hi:
+                x = self._last()
+            else:
+                x = self._last_below(hi)
+            while x != self.nil and (None == lo or not x._sort_key < lo):
+                y = self.predecessor(x)
+                yield x
+                x = y
+        else:
+            if None == lo:
+                x = self._first()
+            else:
+                x = self._lower_bound(lo)
+            while x != self.nil and (None == hi or x._sort_key < hi):
+                y = self.successor(x)
+                yield x
+                x = y
+
+
+    def cursor(self, key=None):
+        """
+        @return: A cursor positioned at the first node whose key is not less than key,
+        or at the minimum if key is None.
+        """
+        if None == key:
+            x = self._first()
+        else:
+            x = self._lower_bound(self._sort_key_of(key))
+        return rbcursor(self, x)
+
+
+    def _first(self):
+        "@return: The minimum node or self.nil if the tree is empty."
+        if self.root == self.nil:
+            return self.nil
+        return self.minimum()
+
+
+    def _last(self):
+        "@return: The maximum node or self.nil if the tree is empty."
+        if self.root == self.nil:
+            return self.nil
+        return self.maximum()
+
+
+    def _last_below(self, key):
+        """
+        @return: The last node whose sort key is less than key or self.nil if there is none.
+        """
+        y = self.nil
+        x = self.root
+        while x != self.nil:
+            if x._sort_key < key:
+                y = x
+                x = x.right
+            else:
+                x = x.left
+        return y
+
+
+    def _lower_bound(self, key):
+        """
+        @return: The first node whose sort key is not less than key or self.nil if there is none.
+        """
+        y = self.nil
+        x = self.root
+        while x != self.nil:
+            if x._sort_key < key:
+                x = x.right
+            else:
+                y = x
+                x = x.left
+        return y
+
+
     def insert_key(self, key):
-        "Insert the key into the tree."
-        self.insert_node(self._create_node(key=key))
+        "Insert the key into the tree. @return: The new node."
+        z = self._create_node(key=key)
+        self.insert_node(z)
+        return z
 
 
     def insert_node(self, z):
         "Insert node z into the tree."
+        z._sort_key = self._sort_key_of(z.key)
         y = self.nil
         x = self.root
         while x != self.nil:
             y = x
-            if z.key < x.key:
+            if z._sort_key < x._sort_key:
                 x = x.left
             else:
                 x = x.right
         z._p = y
         if y == self.nil:
             self._root = z
-        elif z.key < y.key:
+        elif z._sort_key < y._sort_key:
             y._left = z
         else:
             y._right = z
         z._left = self.nil
         z._right = self.nil
         z._red = True
+        self._modified()
         self._insert_fixup(z)
 
 
+    @classmethod
+    def from_sorted(cls, keys, assume_sorted=True, **kwds):
+        """
+        Build a tree from the keys in linear time. The keys are sorted first unless
+        assume_sorted is True, in which case a ValueError is raised if they are not sorted.
+        Any other keyword arguments are passed to the constructor.
+
+        @return: The tree.
+        """
+        t = cls(**kwds)
+        keys = list(keys)
+        sort_keys = [t._sort_key_of(key) for key in keys]
+        if assume_sorted:
+            for i in range(1, len(keys)):
+                if sort_keys[i] < sort_keys[i-1]:
+                    raise ValueError('Keys are not sorted: %s follows %s' % (keys[i], keys[i-1]))
+        else:
+            order = sorted(range(len(keys)), key=sort_keys.__getitem__)
+            keys = [keys[i] for i in order]
+            sort_keys = [sort_keys[i] for i in order]
+        t._build_from_sorted(keys, sort_keys)
+        return t
+
+
+    def _build_from_sorted(self, keys, sort_keys):
+        """
+        Replace the tree with a perfectly balanced one holding the keys, which are sorted
+        by their sort keys.
+        """
+        nodes = [self._create_node(key=key) for key in keys]
+        for x, sort_key in zip(nodes, sort_keys):
+            x._sort_key = sort_key
+        self._link_sorted_nodes(nodes)
+
+
+    def _link_sorted_nodes(self, nodes):
+        """
+        Replace the tree with a perfectly balanced one made of the nodes, which are sorted.
+
+        Every level of the tree is full except possibly the deepest. All nodes are
+        black except those on the deepest level which are red, so every path from
+        the root to a leaf has the same number of black nodes.
+        """
+        nil = self.nil
+        red_depth = len(nodes).bit_length() - 1
+
+        def build(lo, hi, depth, parent):
+            "Link nodes[lo:hi] into a subtree and return its root."
+            if lo == hi:
+                return nil
+            mid = (lo + hi) // 2
+            x = nodes[mid]
+            x._p = parent
+            x._red = depth == red_depth and depth > 0
+            x._left = build(lo, mid, depth + 1, x)
+            x._right = build(mid + 1, hi, depth + 1, x)
+            self._update_node(x)
+            return x
+
+        self._root = build(0, len(nodes), 0, nil)
+        self._modified()
+
+
+    def _modified(self):
+        "Discard any cached arrays when the tree is modified."
+        self._keys_array = None
+        self._sort_keys_array = None
+
+
+    def save(self, path, typecode='d'):
+        """
+        Save the tree in the compact binary format of cookbook.rb_array_tree. Its keys must be
+        representable in the array typecode. Use rbarraytree.load() to memory map the file.
+        """
+        from .rb_array_tree import rbarraytree
+        rbarraytree.from_tree(self, typecode=typecode).save(path)
+
+
+    def as_array(self):
+        """
+        @return: A read-only numpy array of the keys in order. The array is cached until
+        the tree is next modified.
+        """
+        if None is self._keys_array:
+            self._keys_array = _key_array(list(self))
+            self._keys_array.flags.writeable = False
+        return self._keys_array
+
+
+    def search_many(self, keys, return_index=False):
+        """
+        Search for many keys at once with a vectorised binary search of as_array(). If the
+        tree has a key function, an object array of the sort keys is searched instead.
+
+        @return: A boolean array that is True where the keys are in the tree. If return_index is
+        True, also return an array of the number of keys in the tree less than each key.
+        """
+        if None == self._key_func:
+            return search_sorted(self.as_array(), keys, return_index)
+        if None is self._sort_keys_array:
+            self._sort_keys_array = _object_array(x._sort_key for x in self.iter_range())
+        return search_sorted(self._sort_keys_array, _object_array(map(self._key_func, keys)), return_index)
+
+
+    def _update_node(self, x):
+        "Recompute any augmented data stored in x from its key and children."
+        pass
+
+
+    def _update_path(self, x):
+        "Recompute any augmented data stored in x and all its ancestors."
+        pass
+
+
     def _insert_fixup(self, z):
-        "Restore red-black properties after insert."
+        """
+        Restore red-black properties after insert.
+
+        @return: True iff the root was recoloured black, that is the black height of the tree grew.
+        """
         while z.p.red:
             if z.p == z.p.p.left:
                 y = z.p.p.right
@@ -165,7 +482,379 @@ class rbtree(object):
                     z.p._red = False
                     z.p.p._red = True
                     self._left_rotate(z.p.p)
+        root_was_red = self.root.red
         self.root._red = False
+        return root_was_red
+
+
+    def delete_key(self, key):
+        """
+        Delete a node with the key from the tree.
+
+        @return: The deleted node.
+        @raise KeyError: If the key is not in the tree.
+        """
+        z = self.search(key)
+        if z == self.nil:
+            raise KeyError(key)
+        self.delete_node(z)
+        return z
+
+
+    def delete_range(self, lo, hi):
+        """
+        Delete the nodes whose keys lie in the half-open range [lo, hi).
+
+        @return: The number of nodes deleted.
+        """
+        lo = self._sort_key_of(lo)
+        hi = self._sort_key_of(hi)
+        if not lo < hi:
+            return 0
+        bh = self._black_height(self.root)
+        l, l_bh, r, r_bh = self._split(self.root, bh, lo)
+        m, m_bh, r, r_bh = self._split(r, r_bh, hi)
+        root, bh = self._join_trees(l, l_bh, r, r_bh)
+        self._set_root(root)
+
+        # count the nodes we have removed
+        num_deleted = 0
+        stack = [m]
+        while stack:
+            x = stack.pop()
+            if x != self.nil:
+                num_deleted += 1
+                stack.append(x.left)
+                stack.append(x.right)
+        return num_deleted
+
+
+    def split(self, key):
+        """
+        Split the tree in O(log n) time into a tree of the keys less than key and a tree of the
+        remaining keys. The nodes are moved into the new trees which leaves this tree empty.
+
+        @return: The two trees.
+        """
+        bh = self._black_height(self.root)
+        l, l_bh, r, r_bh = self._split(self.root, bh, self._sort_key_of(key))
+        self._set_root(self.nil)
+        return self._empty_like()._set_root(l), self._empty_like()._set_root(r)
+
+
+    def join(self, key, other):
+        """
+        Join the key and the other tree on to the right of this tree. The key must not be less
+        than any key in this tree nor greater than any key in other. The nodes of other are moved
+        into this tree which leaves other empty.
+
+        This takes O(log n) time when the trees share their nil node, for example when they were
+        created by split(), otherwise other's nodes must be adopted which takes time linear in
+        its size.
+        """
+        sort_key = self._sort_key_of(key)
+        if self.root != self.nil and sort_key < self.maximum()._sort_key:
+            raise ValueError('Key (%s) is less than the maximum of the tree' % (key,))
+        if other.root != other.nil and other.minimum()._sort_key < sort_key:
+            raise ValueError('Key (%s) is greater than the minimum of the other tree' % (key,))
+        r = self._adopt(other)
+        z = self._create_node(key=key)
+        z._sort_key = sort_key
+        root, bh = self._join(self.root, self._black_height(self.root), z, r, self._black_height(r))
+        self._set_root(root)
+
+
+    def merge(self, other):
+        """
+        Merge the keys of the other tree into this tree, keeping any duplicates. The nodes of other
+        are moved into this tree which leaves other empty. This splits this tree around each node
+        of other and joins the pieces back together which takes O(m log(n/m)) time, where m is
+        the size of other and n the size of this tree, when the trees share their nil node.
+        """
+        r = self._adopt(other)
+        root, bh = self._union(r, self._black_height(r), self.root, self._black_height(self.root))
+        self._set_root(root)
+
+
+    def _empty_like(self):
+        "@return: An empty tree of the same type that shares our nil node."
+        t = copy.copy(self)
+        t._set_root(self.nil)
+        return t
+
+
+    def _set_root(self, x):
+        "Make x the root of the tree, colouring it black. @return: self."
+        if x != self.nil:
+            x._p = self.nil
+            x._red = False
+        self._root = x
+        self._modified()
+        return self
+
+
+    def _adopt(self, other):
+        """
+        Take the nodes from the other tree, replacing its nil node with ours if necessary.
+
+        @return: The root of the other tree's nodes.
+        """
+        x = other.root
+        other._set_root(other.nil)
+        if other.nil != self.nil:
+            stack = [x]
+            while stack:
+                y = stack.pop()
+                if y != other.nil:
+                    if y.left == other.nil:
+                        y._left = self.nil
+                    else:
+                        stack.append(y.left)
+                    if y.right == other.nil:
+                        y._right = self.nil
+                    else:
+                        stack.append(y.right)
+            if x == other.nil:
+                x = self.nil
+            else:
+                x._p = self.nil
+        return x
+
+
+    def _black_height(self, x):
+        "@return: The number of black nodes on the path from x down to a leaf, not counting the leaf."
+        bh = 0
+        while x != self.nil:
+            if not x.red:
+                bh += 1
+            x = x.left
+        return bh
+
+
+    def _join(self, l, l_bh, z, r, r_bh):
+        """
+        Join the detached subtrees l and r with the node z between them. See Cormen, Leiserson,
+        Rivest, Stein 3rd edition problem 13-2. The subtrees must share our nil node.
+
+        @return: The root and black height of the joined subtree.
+        """
+        nil = self.nil
+        if l.red:
+            l._red = False
+            l_bh += 1
+        if r.red:
+            r._red = False
+            r_bh += 1
+        if l_bh == r_bh:
+            z._p = nil
+            z._left = l
+            z._right = r
+            z._red = False
+            if l != nil:
+                l._p = z
+            if r != nil:
+                r._p = z
+            self._update_node(z)
+            return z, l_bh + 1
+
+        # find the black node y on the facing spine of the taller subtree
+        # with the same black height as the shorter subtree and replace it by z
+        if l_bh > r_bh:
+            root, bh, y, y_bh = l, l_bh, l, l_bh
+            while y.red or y_bh != r_bh:
+                if not y.red:
+                    y_bh -= 1
+                yp = y
+                y = y.right
+            yp._right = z
+            z._left = y
+            z._right = r
+            y_child = y
+            other = r
+        else:
+            root, bh, y, y_bh = r, r_bh, r, r_bh
+            while y.red or y_bh != l_bh:
+                if not y.red:
+                    y_bh -= 1
+                yp = y
+                y = y.left
+            yp._left = z
+            z._left = l
+            z._right = y
+            y_child = y
+            other = l
+        z._p = yp
+        z._red = True
+        if y_child != nil:
+            y_child._p = z
+        if other != nil:
+            other._p = z
+
+        # rebalance the taller subtree as if we had just inserted z into it
+        self._root = root
+        self._update_path(z)
+        if rbtree._insert_fixup(self, z):
+            bh += 1
+        return self._root, bh
+
+
+    def _join_trees(self, l, l_bh, r, r_bh):
+        """
+        Join the detached subtrees l and r, all of whose keys are in order.
+
+        @return: The root and black height of the joined subtree.
+        """
+        if r == self.nil:
+            return l, l_bh
+        if l == self.nil:
+            return r, r_bh
+        self._set_root(r)
+        z = self.minimum()
+        self.delete_node(z)
+        r = self.root
+        return self._join(l, l_bh, z, r, self._black_height(r))
+
+
+    def _split(self, x, bh, key):
+        """
+        Split the detached subtree rooted at x with black height bh into subtrees of the
+        nodes whose sort keys are less than key and the nodes whose sort keys are not.
+
+        @return: The roots and black heights of the two subtrees.
+        """
+        if x == self.nil:
+            return self.nil, 0, self.nil, 0
+        l, r, child_bh = self._detach_children(x, bh)
+        if x._sort_key < key:
+            rl, rl_bh, rr, rr_bh = self._split(r, child_bh, key)
+            l, l_bh = self._join(l, child_bh, x, rl, rl_bh)
+            return l, l_bh, rr, rr_bh
+        else:
+            ll, ll_bh, lr, lr_bh = self._split(l, child_bh, key)
+            r, r_bh = self._join(lr, lr_bh, x, r, child_bh)
+            return ll, ll_bh, r, r_bh
+
+
+    def _union(self, x, x_bh, t, t_bh):
+        """
+        Merge the detached subtrees rooted at x and t by splitting t around x's key.
+
+        @return: The root and black height of the merged subtree.
+        """
+        if x == self.nil:
+            return t, t_bh
+        if t == self.nil:
+            return x, x_bh
+        l, r, child_bh = self._detach_children(x, x_bh)
+        tl, tl_bh, tr, tr_bh = self._split(t, t_bh, x._sort_key)
+        l, l_bh = self._union(l, child_bh, tl, tl_bh)
+        r, r_bh = self._union(r, child_bh, tr, tr_bh)
+        return self._join(l, l_bh, x, r, r_bh)
+
+
+    def _detach_children(self, x, bh):
+        """
+        Detach x's children from it so they can be used as the roots of subtrees.
+
+        @return: The children and their black height.
+        """
+        l, r = x.left, x.right
+        if l != self.nil:
+            l._p = self.nil
+        if r != self.nil:
+            r._p = self.nil
+        if x.red:
+            return l, r, bh
+        return l, r, bh - 1
+
+
+    def delete_node(self, z):
+        "Delete node z from the tree. See Cormen, Leiserson, Rivest, Stein 3rd edition pg 324."
+        y = z
+        y_was_red = y.red
+        if z.left == self.nil:
+            x = z.right
+            self._transplant(z, z.right)
+        elif z.right == self.nil:
+            x = z.left
+            self._transplant(z, z.left)
+        else:
+            y = self.minimum(z.right)
+            y_was_red = y.red
+            x = y.right
+            if y.p == z:
+                x._p = y
+            else:
+                self._transplant(y, y.right)
+                y._right = z.right
+                y.right._p = y
+            self._transplant(z, y)
+            y._left = z.left
+            y.left._p = y
+            y._red = z.red
+        self._update_path(x.p)
+        self._modified()
+        if not y_was_red:
+            self._delete_fixup(x)
+
+
+    def _transplant(self, u, v):
+        "Replace the subtree rooted at u with the subtree rooted at v."
+        if u.p == self.nil:
+            self._root = v
+        elif u == u.p.left:
+            u.p._left = v
+        else:
+            u.p._right = v
+        v._p = u.p
+
+
+    def _delete_fixup(self, x):
+        "Restore red-black properties after delete."
+        while x != self.root and not x.red:
+            if x == x.p.left:
+                w = x.p.right
+                if w.red:
+                    w._red = False
+                    x.p._red = True
+                    self._left_rotate(x.p)
+                    w = x.p.right
+                if not w.left.red and not w.right.red:
+                    w._red = True
+                    x = x.p
+                else:
+                    if not w.right.red:
+                        w.left._red = False
+                        w._red = True
+                        self._right_rotate(w)
+                        w = x.p.right
+                    w._red = x.p.red
+                    x.p._red = False
+                    w.right._red = False
+                    self._left_rotate(x.p)
+                    x = self.root
+            else:
+                w = x.p.left
+                if w.red:
+                    w._red = False
+                    x.p._red = True
+                    self._right_rotate(x.p)
+                    w = x.p.left
+                if not w.right.red and not w.left.red:
+                    w._red = True
+                    x = x.p
+                else:
+                    if not w.left.red:
+                        w.right._red = False
+                        w._red = True
+                        self._left_rotate(w)
+                        w = x.p.left
+                    w._red = x.p.red
+                    x.p._red = False
+                    w.left._red = False
+                    self._right_rotate(x.p)
+                    x = self.root
+        x._red = False
 
 
     def _left_rotate(self, x):
@@ -202,56 +891,146 @@ class rbtree(object):
         y._p = x
 
 
-    def check_invariants(self):
-        "@return: True iff satisfies all criteria to be red-black tree."
-
-        def is_red_black_node(node):
-            "@return: num_black"
-            # check has _left and _right or neither
-            if (node.left and not node.right) or (node.right and not node.left):
-                return 0, False
-
-            # check leaves are black
-            if not node.left and not node.right and node.red:
-                return 0, False
-
-            # if node is red, check children are black
-            if node.red and node.left and node.right:
-                if node.left.red or node.right.red:
-                    return 0, False
-
-            # descend tree and check black counts are balanced
-            if node.left and node.right:
-
-                # check children's parents are correct
-                if self.nil != node.left and node != node.left.p:
-                    return 0, False
-                if self.nil != node.right and node != node.right.p:
-                    return 0, False
-
-                # check children are ok
-                left_counts, left_ok = is_red_black_node(node.left)
-                if not left_ok:
-                    return 0, False
-                right_counts, right_ok = is_red_black_node(node.right)
-                if not right_ok:
-                    return 0, False
-
-                # check children's counts are ok
-                if left_counts != right_counts:
-                    return 0, False
-                return left_counts, True
-            else:
-                return 0, True
+    def check_invariants(self, sample_paths=None, rng=None):
+        """
+        Check the tree with an explicit stack so deep trees do not exceed the recursion limit.
+
+        If sample_paths is given, only check that many random paths from the root to a leaf
+        (using rng or the random module to choose them). This takes O(sample_paths log n)
+        time so is cheap enough to leave on in production code.
+
+        @return: True iff satisfies all criteria to be red-black tree.
+        """
+        nil = self.nil
+        if nil.red or self.root.red:
+            return False
+        if self.root != nil and self.root.p != nil:
+            return False
+        if None != sample_paths:
+            return self._check_sample_paths(sample_paths, rng)
+
+        leaf_black_height = None
+        stack = [(self.root, 0)]
+        while stack:
+            x, black_height = stack.pop()
+            if x == nil:
+                if None == leaf_black_height:
+                    leaf_black_height = black_height
+                elif leaf_black_height != black_height:
+                    return False
+                continue
+            if not self._check_node_locally(x):
+                return False
+            if not x.red:
+                black_height += 1
+            stack.append((x.left, black_height))
+            stack.append((x.right, black_height))
+        return True
+
+
+    def _check_sample_paths(self, sample_paths, rng):
+        "@return: True iff the nodes on sample_paths random paths from the root to a leaf are consistent."
+        if None == rng:
+            import random as rng
+        nil = self.nil
+        black_height = self._black_height(self.root)
+        for _ in range(sample_paths):
+            x = self.root
+            path_black_height = 0
+            while x != nil:
+                if not self._check_node_locally(x):
+                    return False
+                if not x.red:
+                    path_black_height += 1
+                if rng.random() < .5:
+                    x = x.left
+                else:
+                    x = x.right
+            if path_black_height != black_height:
+                return False
+        return True
+
+
+    def _check_node_locally(self, x):
+        "@return: True iff x's links, colour and any augmented data are consistent with its children."
+        nil = self.nil
+        if None == x.left or None == x.right:
+            return False
+        for child in (x.left, x.right):
+            if child != nil:
+                if child.p != x:
+                    return False
+                if x.red and child.red:
+                    return False
+        return self._check_node(x)
+
 
-        num_black, is_ok = is_red_black_node(self.root)
-        return is_ok and not self.root._red
+    def _check_node(self, x):
+        "@return: True iff any augmented data stored in x is consistent with its key and children."
+        return True
 
 
 
 
-def write_tree_as_dot(t, f, show_nil=False):
-    "Write the tree in the dot language format to f."
+def _object_array(values):
+    "@return: A 1-dimensional numpy object array of the values, which may be tuples."
+    import numpy
+    values = list(values)
+    a = numpy.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        a[i] = value
+    return a
+
+
+
+
+def _key_array(keys):
+    """
+    @return: A 1-dimensional numpy array of the keys. It is an object array unless numpy can
+    hold each key as a scalar, so composite keys such as tuples are not split into rows.
+    """
+    import numpy
+    try:
+        a = numpy.array(keys)
+    except ValueError:
+        # keys of different lengths
+        return _object_array(keys)
+    if 1 != a.ndim:
+        return _object_array(keys)
+    return a
+
+
+
+
+def search_sorted(sorted_keys, keys, return_index=False):
+    """
+    Search for the keys in the sorted numpy array sorted_keys. If sorted_keys is an object
+    array, keys must be a sequence of keys, otherwise a single key is searched for as a
+    sequence of one key.
+
+    @return: A boolean array that is True where the keys are in sorted_keys. If return_index
+    is True, also return the indexes at which the keys would be inserted into sorted_keys.
+    """
+    import numpy
+    if object == sorted_keys.dtype:
+        keys = _object_array(keys)
+    else:
+        keys = numpy.atleast_1d(keys)
+    index = numpy.searchsorted(sorted_keys, keys)
+    found = index < len(sorted_keys)
+    found[found] = sorted_keys[index[found]] == keys[found]
+    if return_index:
+        return found, index
+    return found
+
+
+
+
+def write_tree_as_dot(t, f, show_nil=False, max_depth=None):
+    """
+    Write the tree in the dot language format to f. The tree is walked with an explicit
+    stack and written as it goes. Nodes deeper than max_depth (if given) are not written.
+    """
     def node_id(node):
         return 'N%d' % id(node)
 
@@ -261,36 +1040,73 @@ def write_tree_as_dot(t, f, show_nil=False):
         else:
             return "black"
 
-    def visit_node(node):
-        "Visit a node."
-        six.print_("  %s [label=\"%s\", color=\"%s\"];" % (node_id(node), node, node_color(node)), file=f)
-        if node.left:
-            if node.left != t.nil or show_nil:
-                visit_node(node.left)
-                print("  %s -> %s ;" % (node_id(node), node_id(node.left)), file=f)
-        if node.right:
-            if node.right != t.nil or show_nil:
-                visit_node(node.right)
-                print("  %s -> %s ;" % (node_id(node), node_id(node.right)), file=f)
-
     print("// Created by rbtree.write_dot()", file=f)
     print("digraph red_black_tree {", file=f)
-    visit_node(t.root)
+    stack = [(t.root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        print("  %s [label=\"%s\", color=\"%s\"];" % (node_id(node), node, node_color(node)), file=f)
+        if None != max_depth and depth >= max_depth:
+            continue
+        for child in (node.right, node.left):
+            if child:
+                if child != t.nil or show_nil:
+                    stack.append((child, depth + 1))
+                    print("  %s -> %s ;" % (node_id(node), node_id(child)), file=f)
     print("}", file=f)
 
 
 
 
-def test_tree(t, keys):
-    "Insert keys one by one checking invariants and membership as we go."
+def write_tree_as_json(t, f, max_depth=None):
+    """
+    Write the tree to f as nested JSON objects with key, red, left and right members. The
+    tree is walked with an explicit stack and written as it goes. Nodes deeper than max_depth
+    (if given) are not written, their parents have a truncated member set to true instead.
+    Keys that JSON cannot represent are written as strings.
+    """
+    import json
+    stack = [(t.root, 0)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            f.write(item)
+            continue
+        node, depth = item
+        if node == t.nil:
+            f.write('null')
+            continue
+        f.write('{"key": %s, "red": %s' % (json.dumps(node.key, default=str), json.dumps(bool(node.red))))
+        if None != max_depth and depth >= max_depth:
+            if node.left != t.nil or node.right != t.nil:
+                f.write(', "truncated": true')
+            f.write('}')
+            continue
+        f.write(', "left": ')
+        stack.extend(('}', (node.right, depth + 1), ', "right": ', (node.left, depth + 1)))
+
+
+
+
+def test_tree(t, keys, full_check_every=None):
+    """
+    Insert keys one by one checking membership and a sample of the invariants as we go.
+    The invariants are fully checked at the end and every full_check_every inserts if given.
+    """
     assert t.check_invariants()
+    inserted = set()
     for i, key in enumerate(keys):
-        for key2 in keys[:i]:
-            assert t.nil != t.search(key2)
-        for key2 in keys[i:]:
-            assert (t.nil == t.search(key2)) ^ (key2 in keys[:i])
+        assert (t.nil == t.search(key)) ^ (key in inserted)
         t.insert_key(key)
-        assert t.check_invariants()
+        inserted.add(key)
+        assert t.nil != t.search(key)
+        if full_check_every and 0 == (i + 1) % full_check_every:
+            assert t.check_invariants()
+        else:
+            assert t.check_invariants(sample_paths=1)
+    for key in keys:
+        assert t.nil != t.search(key)
+    assert t.check_invariants()
 
 
 if '__main__' == __name__:
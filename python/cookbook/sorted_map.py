@@ -0,0 +1,224 @@
+#
+# Copyright John Reid 2009
+#
+
+
+
+"""
+A map from keys to values that keeps its keys in order, built on an order statistic
+red-black tree. Lookups, inserts and deletes are O(log n) and ordered queries such as
+floor, ceiling, ranges and bisection do not need the keys to be sorted on every read.
+"""
+
+
+from .rb_order_statistic_tree import rbosnode, rbostree
+
+
+class sortedmapnode(rbosnode):
+    """
+    A node of a sorted map that holds the value for its key.
+    """
+
+    def __init__(self, key):
+        "Construct."
+        rbosnode.__init__(self, key)
+        self._value = None
+
+    value = property(fget=lambda self: self._value, doc="The value mapped to by the node's key")
+
+    def __str__(self):
+        "String representation."
+        return '%s: %s' % (self.key, self.value)
+
+
+    def __repr__(self):
+        "String representation."
+        return '%s: %s' % (self.key, self.value)
+
+
+
+
+class SortedMap(object):
+    """
+    A map from keys to values iterated in key order. If key is given, the keys are
+    ordered by the result of calling it on them, see rbtree.
+    """
+
+    def __init__(self, items=(), key=None):
+        "Construct, mapping each (key, value) pair in items."
+
+        self._tree = rbostree(create_node=sortedmapnode, key=key)
+        "The tree that holds the keys and values."
+
+        for k, v in items:
+            self[k] = v
+
+
+    tree = property(fget=lambda self: self._tree, doc="The order statistic tree that holds the map's nodes")
+
+
+    def __len__(self):
+        "@return: The number of keys in the map."
+        return len(self._tree)
+
+
+    def __contains__(self, key):
+        "@return: True iff the key is in the map."
+        return self._tree.search(key) != self._tree.nil
+
+
+    def __iter__(self):
+        "Iterate over the keys in order."
+        for x in self._tree.iter_range():
+            yield x.key
+
+
+    def __reversed__(self):
+        "Iterate over the keys in reverse order."
+        for x in self._tree.iter_range(reverse=True):
+            yield x.key
+
+
+    def __getitem__(self, key):
+        """
+        @return: The value for the key.
+        @raise KeyError: If the key is not in the map.
+        """
+        x = self._tree.search(key)
+        if x == self._tree.nil:
+            raise KeyError(key)
+        return x._value
+
+
+    def __setitem__(self, key, value):
+        "Map the key to the value, replacing any value it had."
+        x = self._tree.search(key)
+        if x == self._tree.nil:
+            x = self._tree._create_node(key=key)
+            self._tree.insert_node(x)
+        x._value = value
+
+
+    def __delitem__(self, key):
+        """
+        Remove the key and its value.
+        @raise KeyError: If the key is not in the map.
+        """
+        self._tree.delete_key(key)
+
+
+    def __repr__(self):
+        "String representation."
+        return 'SortedMap({%s})' % ', '.join('%r: %r' % item for item in self.items())
+
+
+    def get(self, key, default=None):
+        "@return: The value for the key or default if it is not in the map."
+        x = self._tree.search(key)
+        if x == self._tree.nil:
+            return default
+        return x._value
+
+
+    def pop(self, key):
+        """
+        Remove the key.
+        @return: Its value.
+        @raise KeyError: If the key is not in the map.
+        """
+        return self._tree.delete_key(key)._value
+
+
+    def keys(self, lo=None, hi=None, reverse=False):
+        "Iterate over the keys in the half-open range [lo, hi), see rbtree.iter_range()."
+        for x in self._tree.iter_range(lo, hi, reverse):
+            yield x.key
+
+
+    def values(self, lo=None, hi=None, reverse=False):
+        "Iterate over the values of the keys in the half-open range [lo, hi)."
+        for x in self._tree.iter_range(lo, hi, reverse):
+            yield x._value
+
+
+    def items(self, lo=None, hi=None, reverse=False):
+        "Iterate over the (key, value) pairs with keys in the half-open range [lo, hi)."
+        for x in self._tree.iter_range(lo, hi, reverse):
+            yield x.key, x._value
+
+
+    def floor(self, key):
+        """
+        @return: The (key, value) pair with the largest key that is not greater than key.
+        @raise KeyError: If there is no such key.
+        """
+        tree = self._tree
+        sort_key = tree._sort_key_of(key)
+        x = tree._lower_bound(sort_key)
+        if x == tree.nil or x._sort_key != sort_key:
+            x = tree._last_below(sort_key)
+        if x == tree.nil:
+            raise KeyError('No key less than or equal to %s' % (key,))
+        return x.key, x._value
+
+
+    def ceiling(self, key):
+        """
+        @return: The (key, value) pair with the smallest key that is not less than key.
+        @raise KeyError: If there is no such key.
+        """
+        tree = self._tree
+        x = tree._lower_bound(tree._sort_key_of(key))
+        if x == tree.nil:
+            raise KeyError('No key greater than or equal to %s' % (key,))
+        return x.key, x._value
+
+
+    def bisect_left(self, key):
+        "@return: The number of keys in the map less than key, as bisect.bisect_left()."
+        return self._tree.rank(key)
+
+
+    def bisect_right(self, key):
+        "@return: The number of keys in the map not greater than key, as bisect.bisect_right()."
+        tree = self._tree
+        sort_key = tree._sort_key_of(key)
+        x = tree._lower_bound(sort_key)
+        if x == tree.nil:
+            return len(tree)
+        r = tree.node_rank(x)
+        if x._sort_key == sort_key:
+            r += 1
+        return r
+
+
+    def peekitem(self, i=-1):
+        """
+        @return: The (key, value) pair with the i'th smallest key. Negative i count back from
+        the largest key as for lists.
+        @raise IndexError: If i is out of range.
+        """
+        x = self._tree.select(i)
+        return x.key, x._value
+
+
+
+if '__main__' == __name__:
+    import numpy.random as R
+
+    # test the SortedMap
+    R.seed(2)
+    size = 50
+    d = dict()
+    m = SortedMap()
+    for key in R.randint(-50, 50, size=size):
+        d[key] = m[key] = 2 * key
+    assert list(m.items()) == sorted(d.items())
+    assert m.floor(0)[0] == max(k for k in d if k <= 0)
+    assert m.ceiling(0)[0] == min(k for k in d if k >= 0)
+    for key in list(d)[::2]:
+        del d[key]
+        del m[key]
+    assert m.tree.check_invariants()
+    assert list(m.items()) == sorted(d.items())
+    assert list(m.keys(-10, 10)) == sorted(k for k in d if -10 <= k < 10)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+#
+# Copyright John Reid 2009
+#
+
+"""
+Benchmarks for cookbook.interval.Interval comparisons and hashing against the
+(start, end) tuples that back them. Times sorting random intervals, sorting
+them with key=cookbook.interval.sort_key and adding them to a set, for example:
+
+    python interval_benchmarks.py --size 10000000
+"""
+
+from cookbook.interval import Interval, sort_key
+from optparse import OptionParser
+import gc, random, sys, timeit
+
+
+def best_time(f, repeat):
+    "@return: The shortest time taken by repeat calls to f()."
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = timeit.default_timer()
+        f()
+        duration = timeit.default_timer() - start
+        if None == best or duration < best:
+            best = duration
+    return best
+
+
+
+def main(argv):
+    "Run the benchmarks."
+    parser = OptionParser(usage='usage: %prog [options]')
+    parser.add_option('--size', type='int', default=1000000,
+                      help='Number of intervals [default: %default]')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='Report the best of this many runs of each benchmark [default: %default]')
+    parser.add_option('--seed', type='int', default=1,
+                      help='Seed for the random number generator [default: %default]')
+    options, args = parser.parse_args(argv[1:])
+
+    rng = random.Random(options.seed)
+    tuples = []
+    for i in range(options.size):
+        start = rng.randrange(10 * options.size)
+        tuples.append((start, start + rng.randint(0, 100)))
+    intervals = [Interval(start, end) for start, end in tuples]
+
+    benchmarks = (
+        ('sort tuples', lambda: sorted(tuples)),
+        ('sort intervals', lambda: sorted(intervals)),
+        ('sort intervals by sort_key', lambda: sorted(intervals, key=sort_key)),
+        ('set of tuples', lambda: set(tuples)),
+        ('set of intervals', lambda: set(intervals)),
+    )
+    baseline = None
+    print('%-28s %10s %10s' % ('benchmark', 'seconds', 'ratio'))
+    for name, f in benchmarks:
+        duration = best_time(f, options.repeat)
+        if None == baseline:
+            baseline = duration
+        print('%-28s %10.3f %10.2f' % (name, duration, duration / baseline))
+        sys.stdout.flush()
+
+
+if '__main__' == __name__:
+    main(sys.argv)
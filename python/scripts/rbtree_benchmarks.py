@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+
+#
+# Copyright John Reid 2009
+#
+
+"""
+Benchmarks for the red-black trees in cookbook.rbtree, cookbook.rb_array_tree and
+cookbook.rb_interval_tree.
+
+Times inserting, searching and iterating over keys drawn from random, sorted and
+adversarial (alternating smallest and largest) distributions and compares the trees
+with a sorted list maintained by bisect and with a dict that is sorted on every read.
+The trees are also built in bulk with from_sorted(), which includes sorting the keys,
+and searched in one batch with search_many(). The interval tree is timed on insert,
+interval_search and find_closest_intervals.
+
+Reports the rate of each operation in operations per second and, where tracemalloc
+is available, the peak memory used to build each structure. For example:
+
+    python rbtree_benchmarks.py --sizes 1000,100000,10000000 --distributions random
+"""
+
+from cookbook.rbtree import rbtree
+from cookbook.rb_array_tree import rbarraytree
+from cookbook.rb_interval_tree import rbintervaltree
+from cookbook.interval import Interval
+from optparse import OptionParser
+import bisect, gc, random, sys, timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+DISTRIBUTIONS = ('random', 'sorted', 'adversarial')
+"The distributions of keys that we can benchmark."
+
+STRUCTURES = ('rbtree', 'rbarraytree', 'bisect', 'dict', 'rbintervaltree')
+"The structures that we can benchmark."
+
+
+
+def make_keys(distribution, size, rng):
+    "@return: A list of size integer keys from the named distribution."
+    if 'random' == distribution:
+        return [rng.randrange(10 * size) for i in range(size)]
+    if 'sorted' == distribution:
+        return list(range(size))
+    if 'adversarial' == distribution:
+        # alternate between the smallest and largest remaining keys so that every insert
+        # lands at one end of the tree or the other
+        return [i // 2 if 0 == i % 2 else size - 1 - i // 2 for i in range(size)]
+    raise ValueError('Unknown distribution: %s' % distribution)
+
+
+
+def make_intervals(keys, rng, max_length=100):
+    "@return: Intervals starting at each key with random lengths."
+    return [Interval(key, key + rng.randint(1, max_length)) for key in keys]
+
+
+
+def build_rbtree(keys):
+    "@return: An rbtree holding the keys."
+    t = rbtree()
+    insert_key = t.insert_key
+    for key in keys:
+        insert_key(key)
+    return t
+
+
+def build_rbtree_from_sorted(keys):
+    "@return: An rbtree holding the keys built by rbtree.from_sorted()."
+    return rbtree.from_sorted(keys, assume_sorted=False)
+
+
+def build_rbarraytree(keys):
+    "@return: An rbarraytree holding the keys."
+    t = rbarraytree()
+    insert_key = t.insert_key
+    for key in keys:
+        insert_key(key)
+    return t
+
+
+def build_rbarraytree_from_sorted(keys):
+    "@return: An rbarraytree holding the keys built by rbarraytree.from_sorted()."
+    return rbarraytree.from_sorted(keys, assume_sorted=False)
+
+
+def build_sorted_list(keys):
+    "@return: A sorted list of the keys built by inserting each one with bisect.insort()."
+    l = []
+    insort = bisect.insort
+    for key in keys:
+        insort(l, key)
+    return l
+
+
+def build_dict(keys):
+    "@return: A dict with the keys."
+    d = dict()
+    for key in keys:
+        d[key] = None
+    return d
+
+
+def build_rbintervaltree(intervals):
+    "@return: An rbintervaltree holding the intervals."
+    t = rbintervaltree()
+    insert_key = t.insert_key
+    for interval in intervals:
+        insert_key(interval)
+    return t
+
+
+
+def search_rbtree(t, queries):
+    "Search the tree for each query."
+    search = t.search
+    for query in queries:
+        search(query)
+
+
+def search_many(t, queries):
+    """
+    Search the tree for all the queries at once. The array of keys that search_many()
+    searches is cached by the tree so only the first of the repeated runs builds it.
+    """
+    t.search_many(queries)
+
+
+def search_sorted_list(l, queries):
+    "Search the sorted list for each query."
+    bisect_left = bisect.bisect_left
+    n = len(l)
+    for query in queries:
+        i = bisect_left(l, query)
+        i < n and l[i] == query
+
+
+def search_dict(d, queries):
+    "Look up each query in the dict."
+    for query in queries:
+        query in d
+
+
+def iterate(container):
+    "Iterate over the container."
+    for key in container:
+        pass
+
+
+def iterate_dict(d):
+    "Iterate over the keys of the dict in order, sorting them first."
+    for key in sorted(d):
+        pass
+
+
+def interval_search(t, queries):
+    "Search the interval tree for an interval overlapping each query."
+    search = t.interval_search
+    for query in queries:
+        search(query)
+
+
+def find_closest_intervals(t, queries):
+    "Find the intervals in the interval tree closest to each query."
+    find = t.find_closest_intervals
+    for query in queries:
+        find(query)
+
+
+
+BENCHMARKS = {
+    'rbtree': (
+        (('insert', build_rbtree), ('from_sorted', build_rbtree_from_sorted)),
+        (('search', search_rbtree), ('search_many', search_many), ('iterate', iterate))),
+    'rbarraytree': (
+        (('insert', build_rbarraytree), ('from_sorted', build_rbarraytree_from_sorted)),
+        (('search', search_rbtree), ('search_many', search_many), ('iterate', iterate))),
+    'bisect': ((('insert', build_sorted_list),), (('search', search_sorted_list), ('iterate', iterate))),
+    'dict': ((('insert', build_dict),), (('search', search_dict), ('iterate', iterate_dict))),
+    'rbintervaltree': (
+        (('insert', build_rbintervaltree),),
+        (('interval_search', interval_search), ('find_closest_intervals', find_closest_intervals))),
+}
+"""
+Maps each structure to the ways we time building it and the operations we time on it.
+The operations are run on the structure from the first way of building it.
+"""
+
+
+
+def best_time(f, repeat):
+    "@return: The result of f() and the shortest time taken by repeat calls to it."
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = timeit.default_timer()
+        result = f()
+        duration = timeit.default_timer() - start
+        if None == best or duration < best:
+            best = duration
+    return result, best
+
+
+def peak_memory(f):
+    "@return: The peak memory in bytes allocated while calling f() or None if tracemalloc is not available."
+    if None == tracemalloc:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = f()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+
+def benchmark(structure, keys, queries, options):
+    """
+    Benchmark each way of building the structure from the keys and then running each of its
+    operations on the queries.
+
+    @return: A list of (operation, number of operations, seconds, peak memory) tuples.
+    """
+    builds, operations = BENCHMARKS[structure]
+    results = []
+    container = None
+    for name, build in builds:
+        built, duration = best_time(lambda: build(keys), options.repeat)
+        if options.memory:
+            memory = peak_memory(lambda: build(keys))
+        else:
+            memory = None
+        results.append((name, len(keys), duration, memory))
+        if None is container:
+            container = built
+        del built
+    for name, operation in operations:
+        if 'iterate' == name:
+            num_ops = len(keys)
+            run = lambda: operation(container)
+        else:
+            num_ops = len(queries)
+            run = lambda: operation(container, queries)
+        result, duration = best_time(run, options.repeat)
+        results.append((name, num_ops, duration, None))
+    return results
+
+
+
+def format_memory(memory):
+    "@return: The memory in MB formatted for the report."
+    if None == memory:
+        return '-'
+    return '%.1f' % (memory / 1e6)
+
+
+def main(argv):
+    "Run the benchmarks."
+    parser = OptionParser(usage='usage: %prog [options]')
+    parser.add_option('--sizes', default='1000,10000,100000',
+                      help='Comma separated numbers of keys to insert, e.g. 1000,10000000 [default: %default]')
+    parser.add_option('--distributions', default=','.join(DISTRIBUTIONS),
+                      help='Comma separated key distributions from %s [default: %%default]' % ', '.join(DISTRIBUTIONS))
+    parser.add_option('--structures', default=','.join(STRUCTURES),
+                      help='Comma separated structures from %s [default: %%default]' % ', '.join(STRUCTURES))
+    parser.add_option('--num-queries', type='int', default=10000,
+                      help='Number of queries for each search operation [default: %default]')
+    parser.add_option('--max-insort-size', type='int', default=1000000,
+                      help='Skip the bisect structure above this size as insort() is quadratic [default: %default]')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='Report the best of this many runs of each operation [default: %default]')
+    parser.add_option('--no-memory', dest='memory', action='store_false', default=True,
+                      help='Do not measure peak memory with tracemalloc')
+    parser.add_option('--seed', type='int', default=1,
+                      help='Seed for the random number generator [default: %default]')
+    options, args = parser.parse_args(argv[1:])
+    sizes = [int(float(size)) for size in options.sizes.split(',')]
+    distributions = options.distributions.split(',')
+    structures = options.structures.split(',')
+    for structure in structures:
+        if structure not in BENCHMARKS:
+            parser.error('Unknown structure: %s' % structure)
+
+    print('%-15s %-12s %9s %-23s %14s %12s' % (
+        'structure', 'distribution', 'size', 'operation', 'ops/sec', 'peak MB'))
+    for distribution in distributions:
+        for size in sizes:
+            rng = random.Random(options.seed)
+            keys = make_keys(distribution, size, rng)
+            queries = [rng.choice(keys) for i in range(options.num_queries)]
+            for structure in structures:
+                if 'bisect' == structure and size > options.max_insort_size:
+                    continue
+                if 'rbintervaltree' == structure:
+                    results = benchmark(
+                        structure, make_intervals(keys, rng), make_intervals(queries, rng), options)
+                else:
+                    results = benchmark(structure, keys, queries, options)
+                for operation, num_ops, duration, memory in results:
+                    print('%-15s %-12s %9d %-23s %14.0f %12s' % (
+                        structure, distribution, size, operation,
+                        num_ops / max(duration, 1e-9), format_memory(memory)))
+                sys.stdout.flush()
+
+
+if '__main__' == __name__:
+    main(sys.argv)